@@ -0,0 +1,115 @@
+"""Benchmark PAGE_MODEL extraction on large property pages.
+
+Usage: python Utilities/benchmark_page_model.py [captured_page.html ...]
+
+Without arguments two synthetic pages of a few hundred KB are generated: one
+with balanced braces inside strings, and one with unbalanced braces, which
+the legacy brace counter cannot recover from.
+"""
+
+import json
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_getter import extract_page_model  # noqa: E402
+
+
+def legacy_find_json_objects(text):
+    """Previous brace-counting extractor, kept here as the baseline"""
+    pos = 0
+    while True:
+        match = re.search(r"{", text[pos:])
+        if not match:
+            return
+
+        start = pos + match.start()
+        stack = 1
+        pos = start + 1
+
+        for i, char in enumerate(text[pos:], pos):
+            if char == "{":
+                stack += 1
+            elif char == "}":
+                stack -= 1
+                if stack == 0:
+                    try:
+                        obj = json.loads(text[start : i + 1])
+                        yield obj
+                        pos = i + 1
+                        break
+                    except json.JSONDecodeError:
+                        pos = i + 1
+                        break
+        else:
+            return
+
+
+def legacy_extract(text):
+    objects = list(legacy_find_json_objects(text))
+    return objects[0] if objects else None
+
+
+def synthetic_page(unbalanced=False, num_images=200, description_size=20000):
+    """Build a property page with a large PAGE_MODEL script block"""
+    property_data = {
+        "id": "123456789",
+        "text": {
+            "description": ("Spacious {home} with a {garden}. " * 600)[
+                :description_size
+            ]
+        },
+        "images": [
+            {
+                "url": f"https://media.rightmove.co.uk/{i}.jpeg",
+                "caption": "Room {" if unbalanced else "Room",
+            }
+            for i in range(num_images)
+        ],
+        "keyFeatures": [f"Feature {{{i}}}" for i in range(200)],
+        "nearestStations": [
+            {"name": f"Station {i}", "distance": i / 10} for i in range(50)
+        ],
+    }
+    page_model = {"propertyData": property_data, "metadata": {"pad": "x" * 400000}}
+    body = "<div>{ listing }</div>" * 5000
+    return (
+        "<html><head><script>window.adInfo = {'a': 1};</script></head><body>"
+        f"{body}<script>window.PAGE_MODEL = {json.dumps(page_model)}</script>"
+        "</body></html>"
+    )
+
+
+def benchmark(name, text, number=20):
+    script = text[text.find("window.PAGE_MODEL") :]
+    expected = extract_page_model(script)
+    legacy_ok = legacy_extract(script) == expected
+
+    legacy = min(timeit.repeat(lambda: legacy_extract(script), number=number, repeat=3))
+    single_pass = min(
+        timeit.repeat(lambda: extract_page_model(script), number=number, repeat=3)
+    )
+    print(
+        f"{name}: {len(script) / 1024:.0f} KB script, "
+        f"legacy {legacy / number * 1000:.2f} ms, "
+        f"single pass {single_pass / number * 1000:.2f} ms, "
+        f"speedup {legacy / single_pass:.1f}x"
+        + ("" if legacy_ok else " (legacy failed to decode PAGE_MODEL)")
+    )
+
+
+def main():
+    paths = sys.argv[1:]
+    if not paths:
+        benchmark("synthetic", synthetic_page())
+        benchmark("synthetic, unbalanced braces", synthetic_page(unbalanced=True))
+        return
+    for path in paths:
+        benchmark(path, Path(path).read_text(encoding="utf-8"))
+
+
+if __name__ == "__main__":
+    main()
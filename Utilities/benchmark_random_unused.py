@@ -0,0 +1,120 @@
+"""Benchmark picking a game's worth of random unused properties.
+
+Usage: python Utilities/benchmark_random_unused.py [num_rows]
+
+Compares the previous ORDER BY RANDOM() query with a JSON-equality UPDATE
+against PropertyDatabase.get_random_unused_properties on a fresh database,
+then checks the sample is uniform on a table whose unused rowids are gappy:
+a few old unused rows scattered through a used range, followed by a block
+of newly scraped ones.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import PropertyDatabase  # noqa: E402
+
+
+def populate(db, num_rows):
+    conn = db.connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO properties (id, data) VALUES (?, ?)",
+            (
+                (
+                    str(i),
+                    json.dumps(
+                        {"id": str(i), "price": f"£{i * 10:,}", "text": "x" * 1000}
+                    ),
+                )
+                for i in range(num_rows)
+            ),
+        )
+
+
+def legacy_pick(db, count=10):
+    """Previous implementation, without the per-property image queries"""
+    conn = db.connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT data FROM properties WHERE used = 0 ORDER BY RANDOM() LIMIT ?",
+            (count,),
+        )
+        results = cursor.fetchall()
+        cursor.execute(
+            "UPDATE properties SET used = 1 WHERE data IN ({})".format(
+                ",".join("?" * len(results))
+            ),
+            [result[0] for result in results],
+        )
+        return [json.loads(data) for (data,) in results]
+
+
+def timed(name, pick, games=20):
+    start = time.perf_counter()
+    for _ in range(games):
+        assert len(pick(10)) == 10
+    elapsed = (time.perf_counter() - start) / games
+    print(f"{name}: {elapsed * 1000:.2f} ms per game")
+    return elapsed
+
+
+def check_distribution(db, games=500, old=10_000, scattered=20, new=1000):
+    """Average picks per game from the scattered old rows, against uniform"""
+    populate(db, old + new)
+    conn = db.connection()
+    with conn:
+        conn.execute("UPDATE properties SET used = 1 WHERE rowid <= ?", (old,))
+        conn.execute(
+            "UPDATE properties SET used = 0 WHERE rowid <= ? AND rowid % ? = 0",
+            (old, old // scattered),
+        )
+    old_ids = {str(i) for i in range(old)}
+    picked_old = 0
+    for _ in range(games):
+        picked = [handle.id for handle in db.get_random_unused_properties(10)]
+        picked_old += len(old_ids.intersection(picked))
+        with conn:
+            conn.executemany(
+                "UPDATE properties SET used = 0 WHERE id = ?",
+                [(property_id,) for property_id in picked],
+            )
+    observed = picked_old / games
+    expected = 10 * scattered / (scattered + new)
+    print(
+        f"Old rows per game on a gappy table: {observed:.3f} "
+        f"(uniform {expected:.3f}, over {games} games)"
+    )
+    return observed, expected
+
+
+def main():
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        db = PropertyDatabase(os.path.join(tmp, "benchmark.db"))
+        print(f"Populating {num_rows} properties...")
+        populate(db, num_rows)
+
+        legacy = timed("ORDER BY RANDOM() + data IN", lambda n: legacy_pick(db, n))
+        db.reset_used_status()
+        sampled = timed("partial index walk", db.get_random_unused_properties)
+        print(f"Speedup: {legacy / sampled:.0f}x")
+        db.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = PropertyDatabase(os.path.join(tmp, "gappy.db"))
+        observed, expected = check_distribution(db)
+        db.close()
+    # Twice uniform is far beyond sampling noise over 500 games
+    assert observed < 2 * expected, "sample favours rows after rowid gaps"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark region queries against decoding every property's JSON.
+
+Usage: python Utilities/benchmark_spatial.py [num_rows]
+
+Fills a fresh database with properties at random UK locations, then times
+bounding-box, radius and nearest-k lookups through the spatial index
+against a scan that decodes properties.data, checking both agree.
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import PropertyDatabase, haversine_km  # noqa: E402
+
+UK_LAT = (50.0, 58.5)
+UK_LON = (-6.0, 1.7)
+LEEDS = (53.8008, -1.5491)
+
+
+def populate(db, num_rows):
+    rng = random.Random(0)
+    rows = []
+    for i in range(num_rows):
+        lat, lon = rng.uniform(*UK_LAT), rng.uniform(*UK_LON)
+        data = {"id": str(i), "latitude": lat, "longitude": lon, "text": "x" * 1000}
+        rows.append((str(i), json.dumps(data), lat, lon))
+    conn = db.connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO properties (id, data, latitude, longitude) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+    db.rebuild_spatial_index()
+
+
+def scan(db):
+    """Every property decoded from JSON, as the game had to before"""
+    rows = db.connection().execute("SELECT data FROM properties").fetchall()
+    return [json.loads(data) for (data,) in rows]
+
+
+def scan_within(db, latitude, longitude, radius_km):
+    matches = []
+    for data in scan(db):
+        distance = haversine_km(
+            latitude, longitude, data["latitude"], data["longitude"]
+        )
+        if distance <= radius_km:
+            matches.append((distance, data))
+    return sorted(matches, key=lambda match: match[0])
+
+
+def scan_nearest(db, latitude, longitude, k):
+    return sorted(
+        (
+            (haversine_km(latitude, longitude, d["latitude"], d["longitude"]), d)
+            for d in scan(db)
+        ),
+        key=lambda match: match[0],
+    )[:k]
+
+
+def scan_bbox(db, min_lat, max_lat, min_lon, max_lon):
+    return [
+        d
+        for d in scan(db)
+        if min_lat <= d["latitude"] <= max_lat and min_lon <= d["longitude"] <= max_lon
+    ]
+
+
+def timed(query, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = query()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def compare(name, scan_query, index_query, key):
+    expected, scan_time = timed(scan_query, repeat=1)
+    actual, index_time = timed(index_query)
+    same = sorted(map(key, expected)) == sorted(map(key, actual))
+    print(
+        f"{name}: {len(actual)} results, scan {scan_time * 1000:.1f} ms, "
+        f"index {index_time * 1000:.2f} ms ({scan_time / index_time:.0f}x), "
+        f"match: {same}"
+    )
+
+
+def main():
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        db = PropertyDatabase(os.path.join(tmp, "benchmark.db"))
+        print(f"Populating {num_rows} properties...")
+        populate(db, num_rows)
+        print("R*Tree" if db.has_rtree else "No rtree module: using B-tree index")
+
+        bbox = (53.7, 53.9, -1.7, -1.4)
+        compare(
+            "Bounding box around Leeds",
+            lambda: scan_bbox(db, *bbox),
+            lambda: db.properties_in_bbox(*bbox),
+            lambda d: d["id"],
+        )
+        compare(
+            "Within 20km of Leeds",
+            lambda: scan_within(db, *LEEDS, 20),
+            lambda: db.properties_within(*LEEDS, 20),
+            lambda match: match[1]["id"],
+        )
+        compare(
+            "Nearest 10 to Leeds",
+            lambda: scan_nearest(db, *LEEDS, 10),
+            lambda: db.nearest_properties(*LEEDS, 10),
+            lambda match: match[1]["id"],
+        )
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Load test the ingest pipeline against a local stand-in server.
+
+Usage: python Utilities/benchmark_standin.py captures.db target city [city ...]
+           [--workers 2 4 8] [--latency 0.1] [--error-rate 0.05] [--rate 50]
+
+captures.db is a recording of the same ingest, made with
+`python data_getter.py --ingest N --cities ... --record captures.db`.
+Each worker count runs against a fresh database and a fresh server seeded
+the same way, and reports throughput, retries and injected faults.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_getter import IngestStats, bulk_ingest, scrape_session  # noqa: E402
+from database import PropertyDatabase  # noqa: E402
+from replay import Recording, StandinServer  # noqa: E402
+from request_scheduler import RequestScheduler  # noqa: E402
+
+
+async def ingest(server, db, target, cities, workers, client_rate):
+    # Created in the running loop, which its semaphores are bound to on 3.9
+    scheduler = RequestScheduler(
+        max_concurrency=workers * 2,
+        per_host_concurrency=workers * 2,
+        rate=client_rate,
+        burst=client_rate,
+        backoff_base=0.05,
+    )
+    stats = IngestStats()
+    async with scrape_session(scheduler=scheduler, standin_url=server.url):
+        await bulk_ingest(
+            target, cities, db, workers=workers, scheduler=scheduler, stats=stats
+        )
+    return stats, scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording")
+    parser.add_argument("target", type=int)
+    parser.add_argument("cities", nargs="+")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--rate", type=float, help="server requests per second")
+    parser.add_argument("--client-rate", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    recording = Recording(args.recording)
+    results = []
+    for workers in args.workers:
+        server = StandinServer(
+            recording,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            rate=args.rate,
+        ).start()
+        with tempfile.TemporaryDirectory() as tmp:
+            db = PropertyDatabase(os.path.join(tmp, "benchmark.db"))
+            start = time.perf_counter()
+            stats, scheduler = asyncio.run(
+                ingest(server, db, args.target, args.cities, workers, args.client_rate)
+            )
+            elapsed = time.perf_counter() - start
+            db.close()
+        server.stop()
+        results.append((workers, elapsed, stats, scheduler, server))
+
+    for workers, elapsed, stats, scheduler, server in results:
+        print(
+            f"{workers} workers: {len(stats.saved)} properties in {elapsed:.1f}s "
+            f"({len(stats.saved) / elapsed:.1f}/s)"
+        )
+        print(f"  {scheduler.summary()}")
+        print(f"  {server.summary()}")
+    print(recording.summary())
+    recording.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Time TopoJSON decoding in generate_uk_polygons against the old decoder.
+
+Usage: python Utilities/benchmark_uk_polygons.py [topo_lad.json]
+
+Without a path the file is downloaded. Checks that both decoders produce
+an identical uk_polygons.json.
+"""
+
+import json
+import sys
+import time
+
+from generate_uk_polygons import download_topojson, extract_polygons
+
+
+def legacy_transform_point(point, transform):
+    x = transform["scale"][0] * point[0] + transform["translate"][0]
+    y = transform["scale"][1] * point[1] + transform["translate"][1]
+    return [x, y]
+
+
+def legacy_decode_arc(arc, transform):
+    points = []
+    x, y = 0, 0
+    for delta in arc:
+        x += delta[0]
+        y += delta[1]
+        points.append(legacy_transform_point([x, y], transform))
+    return points
+
+
+def legacy_ring(ring_indices, topology_arcs, transform):
+    ring_coords = []
+    for idx in ring_indices:
+        actual_idx = abs(idx) - 1 if idx < 0 else idx
+        points = legacy_decode_arc(topology_arcs[actual_idx], transform)
+        if idx < 0:
+            points = points[::-1]
+        if len(ring_coords) > 0:
+            ring_coords.extend(points[1:])
+        else:
+            ring_coords.extend(points)
+    return ring_coords
+
+
+def legacy_extract_polygons(topojson):
+    """Point-by-point decoder previously used by generate_uk_polygons"""
+    polygons = []
+    transform = topojson["transform"]
+    topology_arcs = topojson["arcs"]
+    first_key = list(topojson["objects"].keys())[0]
+
+    def polygon(arc_indices):
+        if isinstance(arc_indices[0], list):
+            return [legacy_ring(r, topology_arcs, transform) for r in arc_indices]
+        return [legacy_ring(arc_indices, topology_arcs, transform)]
+
+    for geometry in topojson["objects"][first_key]["geometries"]:
+        if geometry["type"] == "Polygon":
+            polygons.extend(polygon(geometry["arcs"]))
+        elif geometry["type"] == "MultiPolygon":
+            for poly_arcs in geometry["arcs"]:
+                polygons.extend(polygon(poly_arcs))
+    return polygons
+
+
+def timed(extract, topojson):
+    start = time.perf_counter()
+    polygons = extract(topojson)
+    return polygons, time.perf_counter() - start
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            topojson = json.load(f)
+    else:
+        topojson = download_topojson()
+
+    legacy, legacy_time = timed(legacy_extract_polygons, topojson)
+    vectorized, vectorized_time = timed(extract_polygons, topojson)
+
+    identical = json.dumps(legacy) == json.dumps(vectorized)
+    print(f"{len(vectorized)} polygons, output identical: {identical}")
+    print(
+        f"legacy {legacy_time:.2f}s, vectorized {vectorized_time:.2f}s, "
+        f"speedup {legacy_time / vectorized_time:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,27 @@
+import argparse
 import json
+import sys
 import urllib.request
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from polygon_format import write_polygon_file  # noqa: E402
+
+BINARY_OUTPUT = "uk_polygons.bin"
+JSON_OUTPUT = "uk_polygons.json"
+
+UK_BOUNDS = {
+    "x": [-8, 2],  # UK longitude bounds from original plot
+    "y": [50, 59],  # UK latitude bounds from original plot
+}
+
+# Douglas-Peucker tolerance in degrees for each level of detail. The base
+# map renders about 100 px per degree, so "base_map" stays under half a
+# pixel. It is the only resolution the game renders.
+LOD_TOLERANCES = {"full": 0.0, "base_map": 0.004}
 
 
 def download_topojson():
@@ -11,74 +33,56 @@ def download_topojson():
     return json.loads(data)
 
 
-def transform_point(point, transform):
-    """Transform a point using TopoJSON transform parameters"""
-    x = transform["scale"][0] * point[0] + transform["translate"][0]
-    y = transform["scale"][1] * point[1] + transform["translate"][1]
-    return [x, y]
-
-
-def decode_arc(arc, transform):
-    """Decode a delta-encoded arc to absolute coordinates"""
-    points = []
-    x, y = 0, 0  # Initialize previous point
-
-    for delta in arc:
-        # Add delta to previous coordinates (delta encoding)
-        x += delta[0]
-        y += delta[1]
-        # Transform to actual coordinates
-        point = transform_point([x, y], transform)
-        points.append(point)
-
-    return points
+class ArcDecoder:
+    """Decode TopoJSON arcs to absolute coordinates, once per arc index"""
+
+    def __init__(self, topology_arcs, transform):
+        self.topology_arcs = topology_arcs
+        self.scale = np.asarray(transform["scale"], dtype=np.float64)
+        self.translate = np.asarray(transform["translate"], dtype=np.float64)
+        self.cache = {}
+
+    def decode(self, actual_idx):
+        """Delta-decode and transform an arc with a cumulative sum"""
+        points = self.cache.get(actual_idx)
+        if points is None:
+            deltas = np.asarray(self.topology_arcs[actual_idx])[:, :2]
+            # Same float operations, in the same order, as the scalar
+            # x * scale + translate, so the output is bit-for-bit identical
+            coords = np.cumsum(deltas, axis=0) * self.scale + self.translate
+            # Convert to Python floats once; rings share these point lists
+            points = coords.tolist()
+            self.cache[actual_idx] = points
+        return points
+
+    def arc(self, idx):
+        """Decoded arc for a signed index; negative indices are reversed"""
+        if idx < 0:
+            return self.decode(abs(idx) - 1)[::-1]
+        return self.decode(idx)
+
+    def ring(self, ring_indices):
+        """Join a ring's arcs, dropping the duplicate point at each junction"""
+        ring_coords = []
+        for idx in ring_indices:
+            points = self.arc(idx)
+            ring_coords.extend(points[1:] if ring_coords else points)
+        return ring_coords
 
 
-def extract_polygon_coordinates(arc_indices, topology_arcs, transform):
+def extract_polygon_coordinates(arc_indices, decoder):
     """Extract and transform coordinates for a polygon"""
-    coordinates = []
-
     # Handle nested arrays for MultiPolygon
     if isinstance(arc_indices[0], list):
-        for ring_indices in arc_indices:
-            ring_coords = []
-            for idx in ring_indices:
-                # Handle negative indices (reversed arc)
-                actual_idx = abs(idx) - 1 if idx < 0 else idx
-                arc = topology_arcs[actual_idx]
-                # Decode and transform the arc
-                points = decode_arc(arc, transform)
-                if idx < 0:  # If negative, reverse the coordinates
-                    points = points[::-1]
-                # Extend ring coordinates, excluding duplicate point at ring junction
-                if len(ring_coords) > 0:
-                    ring_coords.extend(points[1:])
-                else:
-                    ring_coords.extend(points)
-            coordinates.append(ring_coords)
-    else:
-        # Single ring polygon
-        ring_coords = []
-        for idx in arc_indices:
-            actual_idx = abs(idx) - 1 if idx < 0 else idx
-            arc = topology_arcs[actual_idx]
-            points = decode_arc(arc, transform)
-            if idx < 0:
-                points = points[::-1]
-            if len(ring_coords) > 0:
-                ring_coords.extend(points[1:])
-            else:
-                ring_coords.extend(points)
-        coordinates.append(ring_coords)
-
-    return coordinates
+        return [decoder.ring(ring_indices) for ring_indices in arc_indices]
+    # Single ring polygon
+    return [decoder.ring(arc_indices)]
 
 
 def extract_polygons(topojson):
     """Extract polygon coordinates from TopoJSON"""
     polygons = []
-    transform = topojson["transform"]
-    topology_arcs = topojson["arcs"]
+    decoder = ArcDecoder(topojson["arcs"], topojson["transform"])
 
     # Get the geometries from the first object
     first_key = list(topojson["objects"].keys())[0]
@@ -86,49 +90,112 @@ def extract_polygons(topojson):
 
     for geometry in geometries:
         if geometry["type"] == "Polygon":
-            coords = extract_polygon_coordinates(
-                geometry["arcs"], topology_arcs, transform
-            )
+            coords = extract_polygon_coordinates(geometry["arcs"], decoder)
             polygons.extend(coords)
         elif geometry["type"] == "MultiPolygon":
             for poly_arcs in geometry["arcs"]:
-                coords = extract_polygon_coordinates(
-                    poly_arcs, topology_arcs, transform
-                )
+                coords = extract_polygon_coordinates(poly_arcs, decoder)
                 polygons.extend(coords)
 
     return polygons
 
 
-def save_polygons(polygons, output_file="uk_polygons.json"):
+def simplify_ring(points, tolerance):
+    """Douglas-Peucker simplification of one ring, keeping its endpoints"""
+    points = np.asarray(points, dtype=np.float64)
+    if tolerance <= 0 or len(points) <= 3:
+        return points
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1 : end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            # Closed ring: measure distance from the shared endpoint
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            cross = segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]
+            distances = np.abs(cross) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            index = start + 1 + farthest
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return points[keep]
+
+
+def build_levels(polygons, tolerances=LOD_TOLERANCES):
+    """Simplify every ring for each level of detail, dropping collapsed rings"""
+    levels = {}
+    for name, tolerance in tolerances.items():
+        rings = []
+        for ring in polygons:
+            simplified = simplify_ring(ring, tolerance)
+            # A closed ring needs at least three distinct points
+            if len(simplified) >= 4 or (tolerance == 0 and len(simplified)):
+                rings.append(simplified)
+        levels[name] = {"tolerance": tolerance, "rings": rings}
+        points = sum(len(ring) for ring in rings)
+        print(f"  {name}: {len(rings)} rings, {points} points")
+    return levels
+
+
+def save_polygons_binary(polygons, output_file=BINARY_OUTPUT):
+    """Save polygons with every level of detail to the binary format"""
+    print(f"Saving {len(polygons)} polygons to {output_file}...")
+    write_polygon_file(output_file, build_levels(polygons), UK_BOUNDS)
+
+
+def save_polygons(polygons, output_file=JSON_OUTPUT):
     """Save polygons to JSON file"""
     print(f"Saving {len(polygons)} polygons to {output_file}...")
     with open(output_file, "w") as f:
         json.dump(
             {
                 "polygons": polygons,
-                "bounds": {
-                    "x": [-8, 2],  # UK longitude bounds from original plot
-                    "y": [50, 59],  # UK latitude bounds from original plot
-                },
+                "bounds": UK_BOUNDS,
             },
             f,
         )
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate UK map polygons")
+    parser.add_argument(
+        "--topojson", help="read a local topo_lad.json instead of downloading"
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help=f"also export the full-detail polygons to {JSON_OUTPUT}",
+    )
+    args = parser.parse_args()
+
     # Download and parse TopoJSON
-    topojson = download_topojson()
+    if args.topojson:
+        with open(args.topojson) as f:
+            topojson = json.load(f)
+    else:
+        topojson = download_topojson()
 
     # Extract polygons
     print("Extracting and transforming polygons...")
     polygons = extract_polygons(topojson)
 
     # Save to file
-    save_polygons(polygons)
+    save_polygons_binary(polygons)
+    if args.json:
+        save_polygons(polygons)
 
     print(
-        "Done! You can now use uk_polygons.json for plotting without shapely/geopandas"
+        f"Done! You can now use {BINARY_OUTPUT} for plotting without shapely/geopandas"
     )
 
 
@@ -0,0 +1,69 @@
+"""Serve a recording of rightmove responses as a local stand-in server.
+
+Usage: python Utilities/standin_server.py captures.db [--port 8765]
+           [--latency 0.05] [--jitter 0.05] [--error-rate 0.05] [--rate 20]
+
+Record captures with `python data_getter.py ... --record captures.db`, then
+point the scraper at the server with `--standin http://127.0.0.1:8765`.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from replay import Recording, StandinServer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", help="recording written by --record")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to every response"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="up to this many more seconds"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="fraction answered with 503"
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        help="requests per second served before answering 429",
+    )
+    parser.add_argument("--burst", type=float, help="token bucket size for --rate")
+    parser.add_argument("--seed", type=int, default=0, help="seed for injected faults")
+    args = parser.parse_args()
+
+    recording = Recording(args.recording)
+    server = StandinServer(
+        recording,
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate=args.rate,
+        burst=args.burst,
+        seed=args.seed,
+    ).start()
+    print(f"Serving {len(recording)} recorded responses at {server.url}")
+    try:
+        while True:
+            time.sleep(10)
+            print(server.summary())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(server.summary())
+        recording.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 from kivy.app import App
 from kivy.uix.screenmanager import ScreenManager
 
+from database import PropertyDatabase
+from replenisher import PropertyReplenisher
 from screens.loading_screen import LoadingScreen
 from screens.menu_screen import MenuScreen
 from screens.property_game import PropertyGame
@@ -10,18 +12,35 @@ class PropertyGameApp(App):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._running = True
+        self.db = None
+        self.replenisher = None
 
     def build(self):
         self.icon = "logo.png"
+        # One database shared by every screen and the generation thread
+        self.db = PropertyDatabase()
+        # Keeps the unused pool topped up for as long as the app runs
+        self.replenisher = PropertyReplenisher(self.db)
         sm = ScreenManager()
-        sm.add_widget(MenuScreen(name="menu"))
+        sm.add_widget(MenuScreen(name="menu", db=self.db, replenisher=self.replenisher))
         sm.add_widget(LoadingScreen(name="loading"))
-        sm.add_widget(PropertyGame(name="game"))
+        sm.add_widget(
+            PropertyGame(name="game", db=self.db, replenisher=self.replenisher)
+        )
         return sm
 
+    def on_start(self):
+        self.replenisher.start()
+
     def stop(self, *largs):
         self._running = False
         return super(PropertyGameApp, self).stop(*largs)
 
     def on_stop(self):
         self._running = False
+        if self.replenisher:
+            self.replenisher.stop()
+        if self.root:
+            self.root.get_screen("game").stop_prefetch()
+        if self.db:
+            self.db.close()
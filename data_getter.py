@@ -1,18 +1,35 @@
+import argparse
 import asyncio
 import io
 import json
 import random
+import re
+import time
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from typing import List, TypedDict
+from typing import AsyncIterator, Dict, List, Optional, TypedDict, Union
 from urllib.parse import urlencode
 
 import jmespath
-import matplotlib.pyplot as plt
-from httpx import AsyncClient
-from matplotlib.collections import PatchCollection
-from matplotlib.patches import Polygon
-
-from database import PropertyDatabase
+from bs4 import BeautifulSoup
+from httpx import AsyncBaseTransport, AsyncClient, Limits
+from PIL import Image
+
+from database import (
+    RENDITION_SIZES,
+    PropertyDatabase,
+    StoredImage,
+    image_hash,
+    property_columns,
+    property_hashes,
+)
+from replay import Recording, ReplayTransport, StandinTransport
+from request_scheduler import RequestScheduler
+from response_cache import ResponseCache
+from uk_map import get_base_map
 
 
 # Type definitions
@@ -70,117 +87,148 @@ TOP_UK_CITIES = [
     "wolverhampton",
 ]
 
-
-def find_json_objects(text: str, decoder=json.JSONDecoder()):
-    """Find JSON objects in text, and generate decoded JSON data"""
-    pos = 0
-    while True:
-        match = text.find("{", pos)
-        if match == -1:
-            break
-        try:
-            result, index = decoder.raw_decode(text[match:])
-            yield result
-            pos = match + index
-        except ValueError:
-            pos = match + 1
-
-
-import json
-import re
-
-from bs4 import BeautifulSoup
-
-
-def find_json_objects(text):
-    """Find JSON objects in text using regex"""
-    pos = 0
-    while True:
-        match = re.search(r"{", text[pos:])
-        if not match:
-            return
-
-        start = pos + match.start()
-        stack = 1
-        pos = start + 1
-
-        for i, char in enumerate(text[pos:], pos):
-            if char == "{":
-                stack += 1
-            elif char == "}":
-                stack -= 1
-                if stack == 0:
-                    try:
-                        obj = json.loads(text[start : i + 1])
-                        yield obj
-                        pos = i + 1
-                        break
-                    except json.JSONDecodeError:
-                        pos = i + 1
-                        break
-        else:
-            return
+# Javascript variable holding the property page's JSON data
+PAGE_MODEL_MARKER = "PAGE_MODEL = "
+_json_decoder = json.JSONDecoder()
+
+# Smallest batch worth the cost of starting a process pool
+PARSE_POOL_MIN_BATCH = 200
+
+# The game draws the location marker at display time, so per-property plot
+# PNGs are only stored on request
+STORE_PLOTS = False
+
+# Display-ready renditions are JPEGs re-encoded at this quality
+RENDITION_QUALITY = 85
+RENDITION_WORKERS = 4
+# The game never shows photos larger than the display rendition, so unless
+# this is set that rendition is stored in place of the full-size original
+KEEP_ORIGINALS = False
+
+# Photos skipped because their URL or content hash was already stored
+image_download_stats = Counter(new=0, known_url=0, duplicate=0)
+
+# How often extract_property avoided the BeautifulSoup fallback
+extract_stats = Counter(fast_path=0, fallback=0)
+
+# Body bytes fetched over the network, and requests the cache answered
+transfer_stats = Counter(bytes=0, cache_hits=0, not_modified=0)
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+}
+
+# Connection pool settings for the shared scrape client
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 30.0
+
+# Client shared by every fetch inside an active scrape_session()
+_session_client: ContextVar[Optional[AsyncClient]] = ContextVar(
+    "_session_client", default=None
+)
+_session_scheduler: ContextVar[Optional[RequestScheduler]] = ContextVar(
+    "_session_scheduler", default=None
+)
+_session_cache: ContextVar[Optional[ResponseCache]] = ContextVar(
+    "_session_cache", default=None
+)
+_session_recording: ContextVar[Optional[Recording]] = ContextVar(
+    "_session_recording", default=None
+)
+
+
+def extract_page_model(text: str) -> Optional[dict]:
+    """Decode the PAGE_MODEL object in one pass, without copying the text"""
+    marker = text.find(PAGE_MODEL_MARKER)
+    if marker == -1:
+        return None
+    start = text.find("{", marker + len(PAGE_MODEL_MARKER))
+    if start == -1:
+        return None
+    try:
+        result, _ = _json_decoder.raw_decode(text, start)
+    except ValueError:
+        return None
+    return result
 
 
 def extract_property(response_text: str) -> dict:
     """Extract property data from rightmove PAGE_MODEL javascript variable"""
+    # Fast path: decode PAGE_MODEL straight from the raw page, no DOM build
+    json_data = extract_page_model(response_text)
+    if json_data is not None and "propertyData" in json_data:
+        extract_stats["fast_path"] += 1
+        return json_data["propertyData"]
+
+    extract_stats["fallback"] += 1
     soup = BeautifulSoup(response_text, "html.parser")
 
     # Find script tag containing PAGE_MODEL
-    script = soup.find("script", string=re.compile("PAGE_MODEL = "))
+    script = soup.find("script", string=re.compile(PAGE_MODEL_MARKER))
 
     if not script:
         print("Not a property listing page")
         return
 
     # Extract JSON data
-    json_data = list(find_json_objects(script.string))[0]
+    json_data = extract_page_model(script.string)
+    if json_data is None:
+        print("Could not decode PAGE_MODEL")
+        return
     return json_data["propertyData"]
 
 
+# JMESPath expressions mapping rightmove cache data to PropertyResult
+PARSE_MAP = {
+    "id": "id",
+    "available": "status.published",
+    "archived": "status.archived",
+    "phone": "contactInfo.telephoneNumbers.localNumber",
+    "bedrooms": "bedrooms",
+    "bathrooms": "bathrooms",
+    "type": "transactionType",
+    "property_type": "propertySubType",
+    "tags": "tags",
+    "description": "text.description",
+    "title": "text.pageTitle",
+    "subtitle": "text.propertyPhrase",
+    "price": "prices.primaryPrice",
+    "price_sqft": "prices.pricePerSqFt",
+    "address": "address",
+    "latitude": "location.latitude",
+    "longitude": "location.longitude",
+    "features": "keyFeatures",
+    "history": "listingHistory",
+    "photos": "images[*].{url: url, caption: caption}",
+    "floorplans": "floorplans[*].{url: url, caption: caption}",
+    "agency": """customer.{
+        id: branchId,
+        branch: branchName,
+        company: companyName,
+        address: displayAddress,
+        commercial: commercial,
+        buildToRent: buildToRent,
+        isNew: isNewHomeDeveloper
+    }""",
+    "industryAffiliations": "industryAffiliations[*].name",
+    "nearest_airports": "nearestAirports[*].{name: name, distance: distance}",
+    "nearest_stations": "nearestStations[*].{name: name, distance: distance}",
+    "sizings": "sizings[*].{unit: unit, min: minimumSize, max: maximumSize}",
+    "brochures": "brochures",
+}
+
+# Compiled once at import so parse_property does not re-parse every path
+COMPILED_PARSE_MAP = {key: jmespath.compile(path) for key, path in PARSE_MAP.items()}
+
+
 def parse_property(data) -> PropertyResult:
     """Parse rightmove cache data for property information"""
-    parse_map = {
-        "id": "id",
-        "available": "status.published",
-        "archived": "status.archived",
-        "phone": "contactInfo.telephoneNumbers.localNumber",
-        "bedrooms": "bedrooms",
-        "bathrooms": "bathrooms",
-        "type": "transactionType",
-        "property_type": "propertySubType",
-        "tags": "tags",
-        "description": "text.description",
-        "title": "text.pageTitle",
-        "subtitle": "text.propertyPhrase",
-        "price": "prices.primaryPrice",
-        "price_sqft": "prices.pricePerSqFt",
-        "address": "address",
-        "latitude": "location.latitude",
-        "longitude": "location.longitude",
-        "features": "keyFeatures",
-        "history": "listingHistory",
-        "photos": "images[*].{url: url, caption: caption}",
-        "floorplans": "floorplans[*].{url: url, caption: caption}",
-        "agency": """customer.{
-            id: branchId,
-            branch: branchName,
-            company: companyName,
-            address: displayAddress,
-            commercial: commercial,
-            buildToRent: buildToRent,
-            isNew: isNewHomeDeveloper
-        }""",
-        "industryAffiliations": "industryAffiliations[*].name",
-        "nearest_airports": "nearestAirports[*].{name: name, distance: distance}",
-        "nearest_stations": "nearestStations[*].{name: name, distance: distance}",
-        "sizings": "sizings[*].{unit: unit, min: minimumSize, max: maximumSize}",
-        "brochures": "brochures",
-    }
     results = {}
-    for key, path in parse_map.items():
-        value = jmespath.search(path, data)
-        results[key] = value
+    for key, expression in COMPILED_PARSE_MAP.items():
+        results[key] = expression.search(data)
 
     # Convert price per square foot to price per square meter
     if results.get("price_sqft"):
@@ -197,19 +245,159 @@ def parse_property(data) -> PropertyResult:
     return results
 
 
-async def fetch_url(url: str, binary: bool = False) -> str:
-    """Fetch URL using httpx"""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.5",
-    }
+def parse_properties(
+    payloads: List[dict], max_workers: Optional[int] = None
+) -> List[PropertyResult]:
+    """Parse a batch of raw property payloads, optionally in a process pool"""
+    if not max_workers or max_workers <= 1 or len(payloads) < PARSE_POOL_MIN_BATCH:
+        return [parse_property(data) for data in payloads]
+
+    chunksize = max(1, len(payloads) // (max_workers * 4))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(parse_property, payloads, chunksize=chunksize))
+
+
+def http2_available() -> bool:
+    """Check whether the optional h2 package needed for HTTP/2 is installed"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_client(
+    max_connections: int = MAX_CONNECTIONS,
+    max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry: float = KEEPALIVE_EXPIRY,
+    http2: Optional[bool] = None,
+    replay: Optional[Recording] = None,
+    standin_url: Optional[str] = None,
+) -> AsyncClient:
+    """Create a pooled httpx client with keep-alive and HTTP/2 when available
+
+    With replay, responses come from the recording without any network.
+    With standin_url, every request goes to that local stand-in server.
+    """
+    if http2 is None:
+        http2 = http2_available()
+    limits = Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    transport: Optional[AsyncBaseTransport] = None
+    if replay is not None:
+        transport = ReplayTransport(replay)
+    elif standin_url:
+        transport = StandinTransport(standin_url, limits=limits)
+    return AsyncClient(
+        headers=HEADERS,
+        limits=limits,
+        http2=http2,
+        follow_redirects=True,
+        transport=transport,
+    )
+
+
+@asynccontextmanager
+async def scrape_session(
+    scheduler: Optional[RequestScheduler] = None,
+    cache: Union[ResponseCache, bool, None] = None,
+    record: Optional[Recording] = None,
+    **client_options,
+) -> AsyncIterator[AsyncClient]:
+    """Share one pooled client, request scheduler and response cache
+
+    cache defaults to the on-disk ResponseCache; pass False to disable it.
+    It is disabled by default when replaying or using a stand-in server, so
+    every request reaches them. With record, every response fetch_url
+    returns is also saved to that recording.
+    """
+    client = _session_client.get()
+    if client is not None:
+        # Nested sessions reuse the outer client, scheduler, cache and recording
+        yield client
+        return
+
+    if cache is None and (
+        client_options.get("replay") or client_options.get("standin_url")
+    ):
+        cache = False
+    own_cache = cache is None or cache is True
+    if own_cache:
+        cache = ResponseCache()
+    client = create_client(**client_options)
+    client_token = _session_client.set(client)
+    scheduler_token = _session_scheduler.set(scheduler or RequestScheduler())
+    cache_token = _session_cache.set(cache or None)
+    recording_token = _session_recording.set(record)
+    try:
+        yield client
+    finally:
+        _session_recording.reset(recording_token)
+        _session_cache.reset(cache_token)
+        _session_scheduler.reset(scheduler_token)
+        _session_client.reset(client_token)
+        await client.aclose()
+        if own_cache:
+            cache.close()
+
+
+def current_scheduler() -> Optional[RequestScheduler]:
+    """Return the scheduler of the active scrape session, if any"""
+    return _session_scheduler.get()
+
 
-    async with AsyncClient() as client:
-        response = await client.get(url, headers=headers, follow_redirects=True)
-        if binary:
-            return response.content
-        return response.text
+def current_cache() -> Optional[ResponseCache]:
+    """Return the response cache of the active scrape session, if any"""
+    return _session_cache.get()
+
+
+def _cached_body(entry, binary: bool):
+    _record_response(entry["url"], 200, entry["body"], entry["encoding"])
+    if binary:
+        return entry["body"]
+    return entry["body"].decode(entry["encoding"] or "utf-8", errors="replace")
+
+
+def _record_response(url: str, status: int, body: bytes, encoding: Optional[str]):
+    recording = _session_recording.get()
+    if recording is not None:
+        recording.record(url, status, body, encoding)
+
+
+async def fetch_url(url: str, binary: bool = False, revalidate: bool = False) -> str:
+    """Fetch URL through the session cache, client and scheduler
+
+    With revalidate, a fresh cached copy is still checked with the server,
+    which can answer 304 Not Modified instead of resending the body.
+    """
+    client = _session_client.get()
+    if client is None:
+        async with scrape_session():
+            return await fetch_url(url, binary, revalidate)
+
+    cache = _session_cache.get()
+    entry = cache.get(url) if cache else None
+    if entry and cache.is_fresh(entry) and not revalidate:
+        transfer_stats["cache_hits"] += 1
+        return _cached_body(cache.hit(entry), binary)
+
+    response = await _session_scheduler.get().fetch(
+        client, url, headers=ResponseCache.conditional_headers(entry)
+    )
+    if entry and response.status_code == 304:
+        transfer_stats["not_modified"] += 1
+        return _cached_body(cache.revalidate(entry), binary)
+    transfer_stats["bytes"] += len(response.content)
+    if cache:
+        cache.store(url, response)
+    _record_response(url, response.status_code, response.content, response.encoding)
+
+    if binary:
+        return response.content
+    return response.text
 
 
 async def find_locations(query: str) -> List[str]:
@@ -227,48 +415,187 @@ async def find_locations(query: str) -> List[str]:
     ]
 
 
+# In-process memo of query -> location IDs, in front of the locations table
+_location_memo: Dict[str, List[str]] = {}
+
+
+def _location_key(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+async def resolve_location(
+    query: str, db: Optional[PropertyDatabase] = None, refresh: bool = False
+) -> List[str]:
+    """Resolve location IDs from the memo, then the database, then typeahead"""
+    key = _location_key(query)
+    if not refresh:
+        if key in _location_memo:
+            return _location_memo[key]
+        location_ids = db.get_location_ids(key) if db else None
+        if location_ids:
+            _location_memo[key] = location_ids
+            return location_ids
+
+    location_ids = await find_locations(query)
+    if location_ids:
+        _location_memo[key] = location_ids
+        if db:
+            db.save_location_ids(key, location_ids)
+    return location_ids
+
+
+async def warm_location_cache(
+    cities: Optional[List[str]] = None,
+    db: Optional[PropertyDatabase] = None,
+    refresh: bool = False,
+) -> Dict[str, List[str]]:
+    """Resolve every city's location IDs concurrently and store them"""
+    if db is None:
+        db = PropertyDatabase()
+    cities = cities or TOP_UK_CITIES
+
+    async with scrape_session():
+        results = await asyncio.gather(
+            *(resolve_location(city, db, refresh) for city in cities),
+            return_exceptions=True,
+        )
+
+    resolved = {}
+    for city, result in zip(cities, results):
+        if isinstance(result, Exception):
+            print(f"Error resolving {city}: {str(result)}")
+        elif not result:
+            print(f"No locations found for {city}")
+        else:
+            resolved[city] = result
+    print(f"Resolved {len(resolved)}/{len(cities)} locations")
+    return resolved
+
+
+# Rightmove's search API pages results and stops serving them past 1000
+RESULTS_PER_PAGE = 24
+MAX_API_RESULTS = 1000
+
+
+def search_url(location_id: str, offset: int) -> str:
+    """Build the search API URL for one page of results"""
+    url = "https://www.rightmove.co.uk/api/_search?"
+    params = {
+        "areaSizeUnit": "sqft",
+        "channel": "BUY",
+        "currencyCode": "GBP",
+        "includeSSTC": "false",
+        "index": offset,
+        "isFetching": "false",
+        "locationIdentifier": location_id,
+        "numberOfPropertiesPerPage": RESULTS_PER_PAGE,
+        "radius": "0.0",
+        "sortType": "6",
+        "viewType": "LIST",
+    }
+    return url + urlencode(params)
+
+
+async def fetch_search_page(location_id: str, offset: int) -> dict:
+    """Fetch and decode one page of search results"""
+    return json.loads(await fetch_url(search_url(location_id, offset)))
+
+
+def result_count(page_data: dict) -> int:
+    """Number of results the API can actually serve for a search"""
+    total_results = int(page_data["resultCount"].replace(",", ""))
+    return min(total_results, MAX_API_RESULTS)
+
+
+async def iter_search_pages(location_id: str) -> AsyncIterator[List[dict]]:
+    """Yield property listings page by page, stopping when the caller does"""
+    first_page_data = await fetch_search_page(location_id, 0)
+    yield first_page_data["properties"]
+
+    for offset in range(
+        RESULTS_PER_PAGE, result_count(first_page_data), RESULTS_PER_PAGE
+    ):
+        page_data = await fetch_search_page(location_id, offset)
+        if not page_data["properties"]:
+            return
+        yield page_data["properties"]
+
+
+async def sample_search(location_id: str, k: int = 1) -> List[dict]:
+    """Pick k random listings, fetching only the pages that contain them"""
+    first_page_data = await fetch_search_page(location_id, 0)
+    total_results = result_count(first_page_data)
+    if total_results == 0 or not first_page_data["properties"]:
+        return []
+
+    indices = random.sample(range(total_results), min(k, total_results))
+    offsets = sorted({index - index % RESULTS_PER_PAGE for index in indices} - {0})
+    pages = {0: first_page_data["properties"]}
+    responses = await asyncio.gather(
+        *(fetch_search_page(location_id, offset) for offset in offsets),
+        return_exceptions=True,
+    )
+    for offset, response in zip(offsets, responses):
+        if isinstance(response, Exception):
+            print(f"Error fetching search page {offset}: {str(response)}")
+            continue
+        pages[offset] = response["properties"]
+
+    picked = set()
+    short = 0
+    for index in indices:
+        offset, position = index - index % RESULTS_PER_PAGE, index % RESULTS_PER_PAGE
+        if offset not in pages:
+            continue
+        # Listings may have dropped off since resultCount was read
+        if position < len(pages[offset]):
+            picked.add((offset, position))
+        else:
+            short += 1
+    # Stand in for missing listings with unpicked ones from the fetched pages
+    spare = [
+        (offset, position)
+        for offset, page in pages.items()
+        for position in range(len(page))
+        if (offset, position) not in picked
+    ]
+    picked.update(random.sample(spare, min(short, len(spare))))
+    results = [pages[offset][position] for offset, position in picked]
+    random.shuffle(results)
+    return results
+
+
 async def scrape_search(location_id: str) -> List[dict]:
     """Scrape property listings for a given location"""
-    RESULTS_PER_PAGE = 24
-
-    def make_url(offset: int) -> str:
-        url = "https://www.rightmove.co.uk/api/_search?"
-        params = {
-            "areaSizeUnit": "sqft",
-            "channel": "BUY",
-            "currencyCode": "GBP",
-            "includeSSTC": "false",
-            "index": offset,
-            "isFetching": "false",
-            "locationIdentifier": location_id,
-            "numberOfPropertiesPerPage": RESULTS_PER_PAGE,
-            "radius": "0.0",
-            "sortType": "6",
-            "viewType": "LIST",
-        }
-        return url + urlencode(params)
-
-    first_page = await fetch_url(make_url(0))
-    first_page_data = json.loads(first_page)
-    total_results = int(first_page_data["resultCount"].replace(",", ""))
+    first_page_data = await fetch_search_page(location_id, 0)
     results = first_page_data["properties"]
 
-    max_api_results = 1000
     tasks = []
     for offset in range(
-        RESULTS_PER_PAGE, min(total_results, max_api_results), RESULTS_PER_PAGE
+        RESULTS_PER_PAGE, result_count(first_page_data), RESULTS_PER_PAGE
     ):
-        tasks.append(fetch_url(make_url(offset)))
+        tasks.append(fetch_search_page(location_id, offset))
 
     if tasks:
-        responses = await asyncio.gather(*tasks)
-        for response in responses:
-            data = json.loads(response)
+        for data in await asyncio.gather(*tasks):
             results.extend(data["properties"])
 
     return results
 
 
+def property_url(property_id) -> str:
+    """URL of a property's listing page"""
+    return f"https://www.rightmove.co.uk/properties/{property_id}#/"
+
+
+def parse_property_page(response_text: str) -> Optional[PropertyResult]:
+    """Extract and parse a property page; CPU bound, safe to run in an executor"""
+    property_data = extract_property(response_text)
+    if not property_data:
+        return None
+    return parse_property(property_data)
+
+
 async def scrape_properties(urls: List[str]) -> List[dict]:
     """Scrape Rightmove property listings for property data"""
     properties = []
@@ -280,9 +607,9 @@ async def scrape_properties(urls: List[str]) -> List[dict]:
             print(f"Error scraping {url}: {str(response)}")
             continue
         try:
-            property_data = extract_property(response)
+            property_data = parse_property_page(response)
             if property_data:
-                properties.append(parse_property(property_data))
+                properties.append(property_data)
         except Exception as e:
             print(f"Error parsing {url}: {str(e)}")
 
@@ -299,66 +626,107 @@ async def download_image(url: str) -> bytes:
 
 
 def create_uk_plot(latitude: float, longitude: float) -> bytes:
-    """Create a UK map plot with the property location marked"""
-    import matplotlib
+    """Create a UK map plot with the property location marked
 
-    matplotlib.use("Agg")  # Set backend before importing pyplot
-
-    # Load the pre-generated UK polygons
-    try:
-        with open("uk_polygons.json", "r") as f:
-            uk_data = json.load(f)
-    except FileNotFoundError:
-        print("UK polygons file not found. Please run generate_uk_polygons.py first.")
+    The base map is rendered once per process; each plot only composites the
+    marker onto a copy of it.
+    """
+    base_map = get_base_map()
+    if base_map is None:
         return None
+    return base_map.render_marker(latitude, longitude)
+
+
+async def download_property_images(
+    property_data: dict, db: Optional[PropertyDatabase] = None
+) -> List[StoredImage]:
+    """Download a property's photos, skipping any the database already holds"""
+
+    async def fetch(url: str) -> Optional[StoredImage]:
+        known_hash = db.get_image_hash_for_url(url) if db else None
+        if known_hash:
+            image_download_stats["known_url"] += 1
+            return {"url": url, "hash": known_hash, "data": None}
+
+        data = await download_image(url)
+        if data is None:
+            return None
+        digest = image_hash(data)
+        if db and db.has_image(digest):
+            image_download_stats["duplicate"] += 1
+            return {"url": url, "hash": digest, "data": None}
+        image_download_stats["new"] += 1
+        return {"url": url, "hash": digest, "data": data}
+
+    urls = [
+        photo["url"]
+        for photo in property_data.get("photos") or []
+        if photo and photo.get("url")
+    ]
+    if not urls:
+        return []
+    images = await asyncio.gather(*(fetch(url) for url in urls))
+    return [image for image in images if image is not None]
 
-    fig, ax = plt.subplots(figsize=(10, 12))
-
-    # Create polygon patches
-    patches = []
-    for polygon_coords in uk_data["polygons"]:
-        patches.append(Polygon(polygon_coords, closed=True))
 
-    # Add polygons to plot
-    collection = PatchCollection(
-        patches, facecolor="lightgray", edgecolor="black", linewidth=0.5
+def create_image_renditions(image_data: bytes) -> Dict[str, bytes]:
+    """Downscale a photo to each RENDITION_SIZES JPEG; CPU bound"""
+    renditions = {}
+    try:
+        with Image.open(io.BytesIO(image_data)) as original:
+            # Let the JPEG decoder skip detail we are about to throw away
+            largest = max(RENDITION_SIZES.values())
+            original.draft("RGB", (largest, largest))
+            image = original.convert("RGB")
+        for kind, max_edge in RENDITION_SIZES.items():
+            rendition = image.copy()
+            rendition.thumbnail((max_edge, max_edge))
+            buf = io.BytesIO()
+            rendition.save(buf, format="JPEG", quality=RENDITION_QUALITY, optimize=True)
+            renditions[kind] = buf.getvalue()
+    except Exception as e:
+        print(f"Error creating image renditions: {str(e)}")
+        return {}
+    return renditions
+
+
+async def add_image_renditions(
+    images: List[StoredImage],
+    executor: Optional[Executor] = None,
+    keep_originals: bool = KEEP_ORIGINALS,
+) -> None:
+    """Attach renditions to every newly downloaded image, in executor
+
+    Without keep_originals, a display rendition smaller than the original
+    replaces it as the stored image data. The image keeps the original's
+    content hash, so deduplication and URL lookups are unaffected.
+    """
+    loop = asyncio.get_running_loop()
+    new_images = [image for image in images if image.get("data") is not None]
+    renditions = await asyncio.gather(
+        *(
+            loop.run_in_executor(executor, create_image_renditions, image["data"])
+            for image in new_images
+        )
     )
-    ax.add_collection(collection)
-
-    # Plot the property location
-    ax.plot(longitude, latitude, "ro", markersize=10)
-
-    # Set the plot bounds
-    ax.set_xlim(uk_data["bounds"]["x"])
-    ax.set_ylim(uk_data["bounds"]["y"])
+    for image, image_renditions in zip(new_images, renditions):
+        display = image_renditions.get("display")
+        if not keep_originals and display and len(display) < len(image["data"]):
+            image["data"] = image_renditions.pop("display")
+        image["renditions"] = image_renditions
 
-    plt.title("Position on UK Map")
-    plt.axis("off")
-    fig.tight_layout()
 
-    # Save to buffer
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png")
-    plt.close(fig)
-    return buf.getvalue()
-
-
-async def save_property_data(property_data: dict, db: PropertyDatabase) -> None:
+async def save_property_data(
+    property_data: dict, db: PropertyDatabase, store_plots: bool = STORE_PLOTS
+) -> None:
     """Save property data and images to database"""
     # Download images
-    images = []
-    tasks = []
-    for photo in property_data.get("photos", []):
-        if photo and photo.get("url"):
-            tasks.append(download_image(photo["url"]))
-
-    if tasks:
-        image_data = await asyncio.gather(*tasks)
-        images = [img for img in image_data if img is not None]
+    images = await download_property_images(property_data, db)
+    await add_image_renditions(images)
 
     # Create UK position plot
     plot_data = None
-    if property_data.get("latitude") and property_data.get("longitude"):
+    if store_plots and property_data.get("latitude") and property_data.get("longitude"):
         plot_data = create_uk_plot(
             property_data["latitude"], property_data["longitude"]
         )
@@ -367,42 +735,778 @@ async def save_property_data(property_data: dict, db: PropertyDatabase) -> None:
     db.add_property(property_data, images, plot_data)
 
 
+# Pipeline stages, in order, as reported to progress_callback
+PIPELINE_STAGES = ["locate", "search", "scrape", "media", "save"]
+PIPELINE_QUEUE_SIZE = 4
+PIPELINE_WORKERS = 4
+DB_WRITE_BATCH_SIZE = 5
+
+
+class PipelineProgress:
+    """Track how many cities have finished each pipeline stage"""
+
+    def __init__(self, total: int, callback=None):
+        self.total = total
+        self.callback = callback
+        self.done = {stage: 0 for stage in PIPELINE_STAGES}
+
+    def advance(self, stage: str, dropped: bool = False):
+        """Mark one city finished at stage, and at every later one if dropped"""
+        index = PIPELINE_STAGES.index(stage)
+        for name in PIPELINE_STAGES[
+            index : len(PIPELINE_STAGES) if dropped else index + 1
+        ]:
+            self.done[name] += 1
+
+        if self.callback and self.total:
+            steps = self.total * len(PIPELINE_STAGES)
+            percent = sum(self.done.values()) / steps * 100
+            self.callback(percent, stage, self.done[stage], self.total)
+
+
+async def _run_stage(
+    stage: str,
+    handler,
+    inbox: asyncio.Queue,
+    outbox: asyncio.Queue,
+    progress: PipelineProgress,
+    workers: int,
+    next_workers: int,
+):
+    """Run workers applying handler to each item until inbox is exhausted"""
+
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is None:
+                return
+            try:
+                result = await handler(item)
+            except Exception as e:
+                print(f"Error processing {item['city']} ({stage}): {str(e)}")
+                result = None
+            if result is None:
+                progress.advance(stage, dropped=True)
+                continue
+            progress.advance(stage)
+            await outbox.put(result)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    for _ in range(next_workers):
+        await outbox.put(None)
+
+
+async def _write_batches(
+    db: PropertyDatabase,
+    inbox: asyncio.Queue,
+    progress: PipelineProgress,
+    saved: List[dict],
+    batch_size: int = DB_WRITE_BATCH_SIZE,
+):
+    """Single writer stage committing finished properties in batches"""
+    loop = asyncio.get_running_loop()
+    batch = []
+
+    async def flush():
+        if not batch:
+            return
+        records = [(item["property"], item["images"], item["plot"]) for item in batch]
+        try:
+            await loop.run_in_executor(None, db.add_properties, records)
+            saved.extend(item["property"] for item in batch)
+            for _ in batch:
+                progress.advance("save")
+        except Exception as e:
+            print(f"Error saving {len(batch)} properties: {str(e)}")
+            for _ in batch:
+                progress.advance("save", dropped=True)
+        batch.clear()
+
+    while True:
+        item = await inbox.get()
+        if item is None:
+            break
+        batch.append(item)
+        if len(batch) >= batch_size or inbox.empty():
+            await flush()
+    await flush()
+
+
 async def generate_random_properties(
-    num_properties: int = 1, db: PropertyDatabase = None, progress_callback=None
+    num_properties: int = 1,
+    db: PropertyDatabase = None,
+    progress_callback=None,
+    workers: int = PIPELINE_WORKERS,
+    cpu_executor: Optional[Executor] = None,
+    store_plots: bool = STORE_PLOTS,
 ) -> List[dict]:
-    """Generate random properties with progress updates"""
+    """Generate random properties through a concurrent, staged pipeline
+
+    Each city flows through locate -> search -> scrape -> media -> save, with
+    a bounded queue between stages. Parsing and plot rendering run in
+    cpu_executor (a ProcessPoolExecutor gives real parallelism), and a
+    single writer stage batches the database inserts. progress_callback is
+    called with (percent, stage, done_in_stage, total). Location plots are
+    only rendered and stored when store_plots is set, since the game draws
+    the marker over a shared base map.
+    """
     if db is None:
         db = PropertyDatabase()
 
     selected_cities = random.sample(TOP_UK_CITIES, num_properties)
     properties = []
+    progress = PipelineProgress(len(selected_cities), progress_callback)
+    loop = asyncio.get_running_loop()
+
+    # pyplot is not thread safe, so the default executor is a single thread
+    own_executor = cpu_executor is None
+    if own_executor:
+        cpu_executor = ThreadPoolExecutor(max_workers=1)
+    # Pillow releases the GIL while decoding and resizing
+    rendition_executor = ThreadPoolExecutor(max_workers=RENDITION_WORKERS)
+
+    async def locate(item):
+        location_ids = await resolve_location(item["city"], db)
+        if not location_ids:
+            return None
+        return {**item, "location_id": location_ids[0]}
+
+    async def search(item):
+        search_results = await sample_search(item["location_id"], 1)
+        if not search_results:
+            return None
+        return {**item, "url": property_url(search_results[0]["id"])}
+
+    async def scrape(item):
+        response = await fetch_url(item["url"])
+        property_data = await loop.run_in_executor(
+            cpu_executor, parse_property_page, response
+        )
+        if not property_data:
+            return None
+        # Record the searched city so the game can filter by it
+        property_data["city"] = item["city"]
+        return {**item, "property": property_data}
+
+    async def media(item):
+        property_data = item["property"]
+        images = await download_property_images(property_data, db)
+        await add_image_renditions(images, rendition_executor)
+        plot_data = None
+        if (
+            store_plots
+            and property_data.get("latitude")
+            and property_data.get("longitude")
+        ):
+            plot_data = await loop.run_in_executor(
+                cpu_executor,
+                create_uk_plot,
+                property_data["latitude"],
+                property_data["longitude"],
+            )
+        return {**item, "images": images, "plot": plot_data}
+
+    queues = [asyncio.Queue(PIPELINE_QUEUE_SIZE) for _ in PIPELINE_STAGES]
+    handlers = [locate, search, scrape, media]
+
+    async def feed():
+        for city in selected_cities:
+            await queues[0].put({"city": city})
+        for _ in range(workers):
+            await queues[0].put(None)
+
+    try:
+        async with scrape_session():
+            stages = [
+                _run_stage(
+                    stage,
+                    handler,
+                    queues[i],
+                    queues[i + 1],
+                    progress,
+                    workers,
+                    1 if i == len(handlers) - 1 else workers,
+                )
+                for i, (stage, handler) in enumerate(zip(PIPELINE_STAGES, handlers))
+            ]
+            await asyncio.gather(
+                feed(), *stages, _write_batches(db, queues[-1], progress, properties)
+            )
+
+            print(current_scheduler().summary())
+            if current_cache():
+                print(current_cache().summary())
+            print(
+                f"PAGE_MODEL extraction: {extract_stats['fast_path']} fast path, "
+                f"{extract_stats['fallback']} fallback"
+            )
+            print(
+                f"Images: {image_download_stats['new']} new, "
+                f"{image_download_stats['known_url']} skipped by URL, "
+                f"{image_download_stats['duplicate']} duplicates"
+            )
+    finally:
+        rendition_executor.shutdown(wait=False)
+        if own_executor:
+            cpu_executor.shutdown(wait=False)
+
+    return properties
+
+
+def print_storage_report(db: PropertyDatabase):
+    """Summarise image deduplication; scans every image reference"""
+    report = db.image_storage_report()
+    print(
+        f"Image store: {report['unique_images']} unique images for "
+        f"{report['references']} references, "
+        f"{report['saved_bytes'] / 1024 / 1024:.1f} MB saved by deduplication"
+    )
+
+
+# A listing that fails this many times is skipped on later resumes
+INGEST_MAX_ATTEMPTS = 3
+# Seconds between checks while the listings in flight could meet the target
+INGEST_POLL_INTERVAL = 0.2
+
+
+class IngestStats:
+    """Counters for a bulk ingest run, summarised as throughput"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.saved: List[dict] = []
+        self.failed = 0
+        self.already_stored = 0
+        self.pages_fetched = 0
+        self.pages_resumed = 0
+        self.start_bytes = transfer_stats["bytes"]
+
+    @property
+    def bytes(self) -> int:
+        """Body bytes fetched over the network, not served from the cache"""
+        return transfer_stats["bytes"] - self.start_bytes
+
+    def summary(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        saved = len(self.saved)
+        return (
+            f"Ingested {saved} properties in {elapsed:.1f}s "
+            f"({saved / elapsed:.2f} properties/s, "
+            f"{self.bytes / elapsed / 1024:.1f} KB/s of {self.bytes / 1024 / 1024:.1f} MB), "
+            f"{self.failed} failures, {self.already_stored} already stored, "
+            f"{self.pages_fetched} search pages fetched, "
+            f"{self.pages_resumed} resumed from checkpoint"
+        )
+
+
+async def _ingest_location_pages(
+    location_id: str, db: PropertyDatabase, stats: IngestStats
+) -> AsyncIterator[List[str]]:
+    """Yield the listing IDs of each search page not yet checkpointed"""
+    done = db.get_ingest_pages(location_id)
+    stats.pages_resumed += len(done)
+    total = done.get(0)
+    if total is None:
+        page_data = await fetch_search_page(location_id, 0)
+        stats.pages_fetched += 1
+        total = result_count(page_data)
+        ids = [str(listing["id"]) for listing in page_data["properties"]]
+        db.save_ingest_page(location_id, 0, total, ids)
+        yield ids
+
+    for offset in range(RESULTS_PER_PAGE, total, RESULTS_PER_PAGE):
+        if offset in done:
+            continue
+        page_data = await fetch_search_page(location_id, offset)
+        stats.pages_fetched += 1
+        ids = [str(listing["id"]) for listing in page_data["properties"]]
+        db.save_ingest_page(location_id, offset, total, ids)
+        if not ids:
+            return
+        yield ids
+
+
+async def bulk_ingest(
+    target: int,
+    cities: Optional[List[str]] = None,
+    db: PropertyDatabase = None,
+    workers: int = PIPELINE_WORKERS,
+    scheduler: Optional[RequestScheduler] = None,
+    stats: Optional[IngestStats] = None,
+    store_plots: bool = STORE_PLOTS,
+    max_attempts: int = INGEST_MAX_ATTEMPTS,
+) -> IngestStats:
+    """Store up to target properties from every search page of cities
+
+    Progress is checkpointed in the database: walked search pages, the
+    listings they found, and failures. A listing is done once it is in
+    properties, so an interrupted run resumes where it stopped and cached
+    responses are not fetched again. target counts listings from these
+    cities already stored by earlier runs.
+    """
+    if db is None:
+        db = PropertyDatabase()
+    stats = stats or IngestStats()
+    cities = cities or TOP_UK_CITIES
+    loop = asyncio.get_running_loop()
+    cpu_executor = ThreadPoolExecutor(max_workers=1)
+    rendition_executor = ThreadPoolExecutor(max_workers=RENDITION_WORKERS)
 
-    for i, city in enumerate(selected_cities):
+    async def scrape(item):
         try:
-            if progress_callback:
-                progress_callback(i * 10)  # Update progress (0-100)
-
-            location_ids = await find_locations(city)
-            if location_ids:
-                search_results = await scrape_search(location_ids[0])
-                if search_results:
-                    random_property = random.choice(search_results)
-                    property_url = f"https://www.rightmove.co.uk/properties/{random_property['id']}#/"
-                    property_details = await scrape_properties([property_url])
-                    if property_details:
-                        property_data = property_details[0]
-                        await save_property_data(property_data, db)
-                        properties.append(property_data)
-
-                        if progress_callback:
-                            progress_callback((i + 1) * 10)  # Update progress (0-100)
+            response = await fetch_url(property_url(item["property_id"]))
+            property_data = await loop.run_in_executor(
+                cpu_executor, parse_property_page, response
+            )
+            if not property_data:
+                raise ValueError("no property data in page")
         except Exception as e:
-            print(f"Error processing {city}: {str(e)}")
-            continue
+            print(f"Error scraping {item['property_id']}: {str(e)}")
+            stats.failed += 1
+            db.record_ingest_failure(item["property_id"], str(e))
+            return None
+        property_data["city"] = item["city"]
+        return {**item, "property": property_data}
+
+    async def media(item):
+        property_data = item["property"]
+        try:
+            images = await download_property_images(property_data, db)
+            await add_image_renditions(images, rendition_executor)
+            plot_data = None
+            if (
+                store_plots
+                and property_data.get("latitude")
+                and property_data.get("longitude")
+            ):
+                plot_data = await loop.run_in_executor(
+                    cpu_executor,
+                    create_uk_plot,
+                    property_data["latitude"],
+                    property_data["longitude"],
+                )
+        except Exception as e:
+            print(f"Error fetching media for {item['property_id']}: {str(e)}")
+            stats.failed += 1
+            db.record_ingest_failure(item["property_id"], str(e))
+            return None
+        return {**item, "images": images, "plot": plot_data}
 
-    return properties
+    try:
+        async with scrape_session(scheduler=scheduler):
+            locations = {}
+            for city in cities:
+                try:
+                    location_ids = await resolve_location(city, db)
+                except Exception as e:
+                    print(f"Error resolving {city}: {str(e)}")
+                    continue
+                if location_ids:
+                    locations[location_ids[0]] = city
+                else:
+                    print(f"No locations found for {city}")
+            if not locations:
+                return stats
+
+            already = db.count_ingested(list(locations))
+            remaining = target - already
+            print(f"{already}/{target} properties already ingested")
+            if remaining <= 0:
+                return stats
+
+            queues = [asyncio.Queue(workers * 2) for _ in range(3)]
+            # Counts every listing leaving the pipeline, saved or dropped
+            progress = PipelineProgress(remaining)
+            seen = set()
+            enqueued = 0
+
+            async def enqueue(pending):
+                """Queue listings until those saved or in flight reach the target"""
+                nonlocal enqueued
+                for property_id, location_id in pending:
+                    if property_id in seen:
+                        continue
+                    # A listing that fails frees its slot for another one
+                    while (
+                        len(stats.saved) + enqueued - progress.done["save"] >= remaining
+                    ):
+                        if enqueued == progress.done["save"]:
+                            return False
+                        await asyncio.sleep(INGEST_POLL_INTERVAL)
+                    seen.add(property_id)
+                    enqueued += 1
+                    await queues[0].put(
+                        {"property_id": property_id, "city": locations[location_id]}
+                    )
+                return True
+
+            async def feed():
+                # Listings found before an interruption come first
+                more = await enqueue(
+                    db.pending_ingest_items(list(locations), max_attempts)
+                )
+                # Then walk the cities' search pages in turn
+                pages = [
+                    (location_id, _ingest_location_pages(location_id, db, stats))
+                    for location_id in locations
+                ]
+                while more and pages:
+                    for entry in list(pages):
+                        location_id, page_iter = entry
+                        try:
+                            ids = await page_iter.__anext__()
+                        except StopAsyncIteration:
+                            pages.remove(entry)
+                            continue
+                        except Exception as e:
+                            print(f"Error searching {locations[location_id]}: {str(e)}")
+                            pages.remove(entry)
+                            continue
+                        pending = db.pending_ingest_items(
+                            [location_id], max_attempts, ids
+                        )
+                        stats.already_stored += len(ids) - len(pending)
+                        more = await enqueue(pending)
+                        if not more:
+                            break
+                for _, page_iter in pages:
+                    await page_iter.aclose()
+                for _ in range(workers):
+                    await queues[0].put(None)
+
+            await asyncio.gather(
+                feed(),
+                _run_stage(
+                    "scrape", scrape, queues[0], queues[1], progress, workers, workers
+                ),
+                _run_stage("media", media, queues[1], queues[2], progress, workers, 1),
+                _write_batches(db, queues[2], progress, stats.saved),
+            )
+            print(current_scheduler().summary())
+            if current_cache():
+                print(current_cache().summary())
+    finally:
+        rendition_executor.shutdown(wait=False)
+        cpu_executor.shutdown(wait=False)
+
+    return stats
+
+
+class RefreshStats:
+    """Counters for a refresh pass over stored properties"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.start_transfer = Counter(transfer_stats)
+        self.checked = 0
+        self.unchanged = 0
+        self.updated = 0
+        self.photos_changed = 0
+        self.status_changed = 0
+        self.failed = 0
+        self.columns_written = 0
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started
+        transfer = Counter(transfer_stats)
+        transfer.subtract(self.start_transfer)
+        return (
+            f"Refreshed {self.checked} properties in {elapsed:.1f}s: "
+            f"{self.unchanged} unchanged, {self.updated} updated, "
+            f"{self.photos_changed} with new photos, "
+            f"{self.status_changed} status changes, {self.failed} failures; "
+            f"downloaded {transfer['bytes'] / 1024 / 1024:.1f} MB "
+            f"({transfer['not_modified']} not modified), "
+            f"wrote {self.columns_written} changed columns"
+        )
+
+
+async def _write_refreshes(
+    db: PropertyDatabase,
+    inbox: asyncio.Queue,
+    progress: PipelineProgress,
+    stats: RefreshStats,
+    batch_size: int = DB_WRITE_BATCH_SIZE,
+):
+    """Single writer stage applying refresh results in batches"""
+    loop = asyncio.get_running_loop()
+    unchanged, updates = [], []
+
+    async def flush():
+        if not unchanged and not updates:
+            return
+        count = len(unchanged) + len(updates)
+        try:
+            stats.columns_written += await loop.run_in_executor(
+                None, db.apply_refresh, list(unchanged), list(updates)
+            )
+            for _ in range(count):
+                progress.advance("save")
+        except Exception as e:
+            print(f"Error saving {count} refreshed properties: {str(e)}")
+            for _ in range(count):
+                progress.advance("save", dropped=True)
+        unchanged.clear()
+        updates.clear()
+
+    while True:
+        item = await inbox.get()
+        if item is None:
+            break
+        if item["property"] is None:
+            unchanged.append(item["stored"]["id"])
+        else:
+            updates.append((item["stored"], item["property"], item["images"]))
+        if len(unchanged) + len(updates) >= batch_size or inbox.empty():
+            await flush()
+    await flush()
+
+
+async def refresh_properties(
+    limit: Optional[int] = None,
+    db: PropertyDatabase = None,
+    older_than_days: float = 0,
+    workers: int = PIPELINE_WORKERS,
+    scheduler: Optional[RequestScheduler] = None,
+    stats: Optional[RefreshStats] = None,
+) -> RefreshStats:
+    """Revisit stored properties, writing only what changed
+
+    Each listing page is revalidated against the response cache, parsed,
+    and compared by content hash and photo URL hash with the stored row.
+    Unchanged properties only get refreshed_at. Changed ones get their
+    changed columns and data, and only photos at new URLs are downloaded.
+    Least recently refreshed properties go first.
+    """
+    if db is None:
+        db = PropertyDatabase()
+    stats = stats or RefreshStats()
+    loop = asyncio.get_running_loop()
+    cpu_executor = ThreadPoolExecutor(max_workers=1)
+    rendition_executor = ThreadPoolExecutor(max_workers=RENDITION_WORKERS)
+
+    async def check(item):
+        stored = item["stored"]
+        stats.checked += 1
+        try:
+            response = await fetch_url(property_url(stored["id"]), revalidate=True)
+            property_data = await loop.run_in_executor(
+                cpu_executor, parse_property_page, response
+            )
+            if not property_data:
+                raise ValueError("no property data in page")
+        except Exception as e:
+            print(f"Error refreshing {stored['id']}: {str(e)}")
+            stats.failed += 1
+            return None
+        property_data["city"] = stored["city"]
+
+        content_hash, photos_hash = property_hashes(property_data)
+        if (content_hash, photos_hash) == (
+            stored["content_hash"],
+            stored["photos_hash"],
+        ):
+            stats.unchanged += 1
+            return {**item, "property": None}
+
+        images = None
+        if photos_hash != stored["photos_hash"]:
+            # Photos at URLs already stored are not downloaded again
+            images = await download_property_images(property_data, db)
+            await add_image_renditions(images, rendition_executor)
+            stats.photos_changed += 1
+        if content_hash != stored["content_hash"]:
+            stats.updated += 1
+        columns = property_columns(property_data)
+        if any(columns[name] != stored[name] for name in ("available", "archived")):
+            stats.status_changed += 1
+        return {**item, "property": property_data, "images": images}
+
+    stored_rows = db.properties_to_refresh(limit, older_than_days)
+    print(f"Refreshing {len(stored_rows)} stored properties...")
+    progress = PipelineProgress(len(stored_rows))
+    queues = [asyncio.Queue(workers * 2) for _ in range(2)]
+
+    async def feed():
+        for stored in stored_rows:
+            await queues[0].put(
+                {"city": stored["city"] or stored["id"], "stored": stored}
+            )
+        for _ in range(workers):
+            await queues[0].put(None)
+
+    try:
+        async with scrape_session(scheduler=scheduler):
+            await asyncio.gather(
+                feed(),
+                _run_stage("scrape", check, queues[0], queues[1], progress, workers, 1),
+                _write_refreshes(db, queues[1], progress, stats),
+            )
+            print(current_scheduler().summary())
+            if current_cache():
+                print(current_cache().summary())
+    finally:
+        rendition_executor.shutdown(wait=False)
+        cpu_executor.shutdown(wait=False)
+
+    return stats
 
 
 if __name__ == "__main__":
-    db = PropertyDatabase()
-    asyncio.run(generate_random_properties(10, db))
+    parser = argparse.ArgumentParser(description="Scrape random Rightmove properties")
+    parser.add_argument(
+        "--warm-locations",
+        nargs="*",
+        metavar="CITY",
+        help="resolve and store location IDs for the given cities "
+        "(default: TOP_UK_CITIES) instead of scraping properties",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="with --warm-locations, re-query typeahead for stored cities",
+    )
+    parser.add_argument(
+        "--ingest",
+        type=int,
+        metavar="N",
+        help="headless bulk ingest: store N properties from every search page "
+        "of --cities, resuming from the checkpoint in the database",
+    )
+    parser.add_argument(
+        "--cities",
+        nargs="+",
+        metavar="CITY",
+        help="with --ingest, the cities to walk (default: TOP_UK_CITIES)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=PIPELINE_WORKERS,
+        help="with --ingest or --refresh-listings, concurrent listings per stage",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=5.0,
+        help="maximum requests per second per host",
+    )
+    parser.add_argument(
+        "--refresh-listings",
+        type=int,
+        nargs="?",
+        const=-1,
+        metavar="N",
+        help="revisit up to N stored properties (default: all), least recently "
+        "refreshed first, writing only what changed",
+    )
+    parser.add_argument(
+        "--older-than",
+        type=float,
+        default=0,
+        metavar="DAYS",
+        help="with --refresh-listings, skip properties refreshed more recently",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="with --ingest, discard the checkpoint and walk every page again",
+    )
+    parser.add_argument(
+        "--storage-report",
+        action="store_true",
+        help="report image deduplication savings instead of scraping",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        help="save every response to the recording at PATH for later replay",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="PATH",
+        help="answer every request from the recording at PATH, with no network",
+    )
+    parser.add_argument(
+        "--standin",
+        metavar="URL",
+        help="send every request to a stand-in server "
+        "(see Utilities/standin_server.py)",
+    )
+    parser.add_argument(
+        "--db",
+        metavar="PATH",
+        help="database to write to (default: ~/properties.db)",
+    )
+    args = parser.parse_args()
+
+    db = PropertyDatabase(args.db)
+    recording = Recording(args.record) if args.record else None
+    replay = Recording(args.replay) if args.replay else None
+
+    async def in_session(coroutine):
+        """Run coroutine in one session carrying the recording options
+
+        The scheduler is created here, inside the running event loop, since
+        its semaphores are bound to the loop they are created in on 3.9.
+        Nested sessions in the coroutine reuse this session's scheduler.
+        """
+        scheduler = RequestScheduler(
+            max_concurrency=args.workers * 2, rate=args.rate, burst=args.rate * 2
+        )
+        async with scrape_session(
+            scheduler=scheduler,
+            record=recording,
+            replay=replay,
+            standin_url=args.standin,
+        ):
+            return await coroutine
+
+    if args.storage_report:
+        print_storage_report(db)
+    elif args.warm_locations is not None:
+        asyncio.run(
+            in_session(warm_location_cache(args.warm_locations, db, args.refresh))
+        )
+    elif args.ingest is not None:
+        if args.restart:
+            db.clear_ingest_checkpoints()
+        stats = IngestStats()
+        try:
+            asyncio.run(
+                in_session(
+                    bulk_ingest(
+                        args.ingest,
+                        args.cities,
+                        db,
+                        workers=args.workers,
+                        stats=stats,
+                    )
+                )
+            )
+        except KeyboardInterrupt:
+            print("Interrupted: run the same command again to resume")
+        print(stats.summary())
+    elif args.refresh_listings is not None:
+        stats = RefreshStats()
+        try:
+            asyncio.run(
+                in_session(
+                    refresh_properties(
+                        None if args.refresh_listings < 0 else args.refresh_listings,
+                        db,
+                        args.older_than,
+                        workers=args.workers,
+                        stats=stats,
+                    )
+                )
+            )
+        except KeyboardInterrupt:
+            print("Interrupted: unfinished properties are refreshed first next time")
+        print(stats.summary())
+    else:
+        asyncio.run(in_session(generate_random_properties(10, db)))
+    for captures in (recording, replay):
+        if captures is not None:
+            print(captures.summary())
+            captures.close()
@@ -1,11 +1,193 @@
+import hashlib
 import io
 import json
+import math
 import os
+import random
+import re
 import sqlite3
+import threading
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple, TypedDict
 
 import matplotlib.pyplot as plt
 
+# Longest edge, in pixels, of the downscaled copies stored for each image
+RENDITION_SIZES = {"thumb": 320, "display": 1280}
+
+
+class StoredImage(TypedDict, total=False):
+    url: str
+    hash: str
+    # None when the bytes are already in image_blobs. Unless originals are
+    # kept, this is the display rendition, still stored under the original's hash
+    data: Optional[bytes]
+    renditions: Dict[str, bytes]  # Downscaled JPEGs keyed by RENDITION_SIZES
+
+
+def image_hash(image_data: bytes) -> str:
+    """Content hash identifying an image in the image_blobs table"""
+    return hashlib.sha256(image_data).hexdigest()
+
+
+# Applied to every new connection. WAL lets the UI thread read while the
+# generation thread writes; NORMAL sync is safe under WAL.
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+]
+# Prepared statements kept per connection by the sqlite3 module
+CACHED_STATEMENTS = 256
+BUSY_TIMEOUT = 30.0
+
+# Typed copies of the hot fields in properties.data, which stays the full
+# record. scraped_at is set by SQLite when the row is written.
+PROPERTY_COLUMNS = {
+    "price": "INTEGER",
+    "bedrooms": "INTEGER",
+    "bathrooms": "INTEGER",
+    "latitude": "REAL",
+    "longitude": "REAL",
+    "property_type": "TEXT",
+    "city": "TEXT",
+    "available": "INTEGER",
+    "archived": "INTEGER",
+    # Hashes of the record without its photos, and of the photo URL list
+    "content_hash": "TEXT",
+    "photos_hash": "TEXT",
+    "scraped_at": "TEXT",
+    "refreshed_at": "TEXT",
+    "status_changed_at": "TEXT",
+}
+# Set by SQLite rather than derived from the record
+TIMESTAMP_COLUMNS = ["scraped_at", "refreshed_at", "status_changed_at"]
+VALUE_COLUMNS = [name for name in PROPERTY_COLUMNS if name not in TIMESTAMP_COLUMNS]
+PROPERTY_INDEXES = {
+    "properties_price": "price",
+    "properties_city": "city, price",
+    "properties_type": "property_type, price",
+    "properties_bedrooms": "bedrooms, price",
+    "properties_location": "latitude, longitude",
+    "properties_scraped_at": "scraped_at",
+}
+
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+# nearest_properties starts searching this far out and doubles the radius
+NEAREST_START_KM = 5.0
+NEAREST_MAX_KM = 2000.0
+# Bound on host parameters per IN (...) query
+MAX_QUERY_PARAMS = 500
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def radius_bbox(latitude: float, longitude: float, radius_km: float):
+    """(min_lat, max_lat, min_lon, max_lon) enclosing a circle"""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(min(abs(latitude) + dlat, 89.9)))
+    dlon = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return latitude - dlat, latitude + dlat, longitude - dlon, longitude + dlon
+
+
+class PropertyFilter(TypedDict, total=False):
+    min_price: int
+    max_price: int
+    bedrooms: int
+    min_bedrooms: int
+    bathrooms: int
+    property_type: str
+    city: str
+
+
+def parse_price(price) -> Optional[int]:
+    """Whole pounds from a display price such as "£250,000", or None"""
+    if isinstance(price, (int, float)):
+        return int(price)
+    if not price:
+        return None
+    # Drop any pence, then everything that is not a digit
+    digits = re.sub(r"\D", "", str(price).split(".")[0])
+    return int(digits) if digits else None
+
+
+def _as_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_flag(value) -> Optional[int]:
+    return None if value is None else int(bool(value))
+
+
+def property_hashes(property_data: dict) -> Tuple[str, str]:
+    """Content hash of the record without photos, and of its photo URLs"""
+    content = {key: value for key, value in property_data.items() if key != "photos"}
+    photos = [photo.get("url") for photo in property_data.get("photos") or [] if photo]
+    return (
+        hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest(),
+        hashlib.sha256(json.dumps(photos).encode()).hexdigest(),
+    )
+
+
+def property_columns(property_data: dict) -> Dict[str, object]:
+    """Typed column values for VALUE_COLUMNS"""
+    content_hash, photos_hash = property_hashes(property_data)
+    return {
+        "price": parse_price(property_data.get("price")),
+        "bedrooms": _as_int(property_data.get("bedrooms")),
+        "bathrooms": _as_int(property_data.get("bathrooms")),
+        "latitude": _as_float(property_data.get("latitude")),
+        "longitude": _as_float(property_data.get("longitude")),
+        "property_type": property_data.get("property_type"),
+        "city": property_data.get("city"),
+        "available": _as_flag(property_data.get("available")),
+        "archived": _as_flag(property_data.get("archived")),
+        "content_hash": content_hash,
+        "photos_hash": photos_hash,
+    }
+
+
+def filter_clause(filters: PropertyFilter):
+    """SQL conditions and parameters selecting properties matching filters"""
+    conditions, params = [], []
+    for key, condition in (
+        ("min_price", "price >= ?"),
+        ("max_price", "price <= ?"),
+        ("bedrooms", "bedrooms = ?"),
+        ("min_bedrooms", "bedrooms >= ?"),
+        ("bathrooms", "bathrooms = ?"),
+        ("property_type", "property_type = ?"),
+        ("city", "city = ?"),
+    ):
+        if filters.get(key) is not None:
+            conditions.append(condition)
+            params.append(filters[key])
+    if not conditions:
+        return "", []
+    return " AND " + " AND ".join(conditions), params
+
 
 class PropertyDatabase:
     def __init__(self, db_path=None):
@@ -13,31 +195,120 @@ class PropertyDatabase:
             documents_dir = os.environ["HOME"]
             db_path = os.path.join(documents_dir, "properties.db")
         self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.has_rtree = True
         self.init_db()
 
+    def connection(self) -> sqlite3.Connection:
+        """Return this thread's persistent connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=BUSY_TIMEOUT,
+                cached_statements=CACHED_STATEMENTS,
+                check_same_thread=False,
+            )
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._connections_lock:
+                # Close connections left behind by threads that have exited
+                for thread, old in self._connections:
+                    if not thread.is_alive():
+                        old.close()
+                self._connections = [
+                    (thread, old)
+                    for thread, old in self._connections
+                    if thread.is_alive()
+                ]
+                self._connections.append((threading.current_thread(), conn))
+        return conn
+
+    def close(self):
+        """Close the connections opened by every thread"""
+        with self._connections_lock:
+            for _, conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
     def init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
                 CREATE TABLE IF NOT EXISTS properties (
                     id TEXT PRIMARY KEY,
                     data TEXT,
-                    used INTEGER DEFAULT 0
+                    used INTEGER DEFAULT 0,
+                    price INTEGER,
+                    bedrooms INTEGER,
+                    bathrooms INTEGER,
+                    latitude REAL,
+                    longitude REAL,
+                    property_type TEXT,
+                    city TEXT,
+                    available INTEGER,
+                    archived INTEGER,
+                    content_hash TEXT,
+                    photos_hash TEXT,
+                    scraped_at TEXT,
+                    refreshed_at TEXT,
+                    status_changed_at TEXT,
+                    spatial_key INTEGER
+                )
+            """
+            )
+            self._migrate_property_columns(cursor)
+            self._migrate_spatial_key(cursor)
+            # Images are stored once per content hash and referenced by
+            # each property that shows them
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS image_blobs (
+                    hash TEXT PRIMARY KEY,
+                    image_data BLOB,
+                    size INTEGER
                 )
             """
             )
             cursor.execute(
                 """
-                CREATE TABLE IF NOT EXISTS property_images (
+                CREATE TABLE IF NOT EXISTS property_image_refs (
                     property_id TEXT,
                     image_index INTEGER,
-                    image_data BLOB,
+                    image_hash TEXT,
                     FOREIGN KEY(property_id) REFERENCES properties(id),
+                    FOREIGN KEY(image_hash) REFERENCES image_blobs(hash),
                     PRIMARY KEY(property_id, image_index)
                 )
             """
             )
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS image_renditions (
+                    image_hash TEXT,
+                    kind TEXT,
+                    max_edge INTEGER,
+                    image_data BLOB,
+                    size INTEGER,
+                    FOREIGN KEY(image_hash) REFERENCES image_blobs(hash),
+                    PRIMARY KEY(image_hash, kind)
+                )
+            """
+            )
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS image_sources (
+                    url TEXT PRIMARY KEY,
+                    image_hash TEXT,
+                    FOREIGN KEY(image_hash) REFERENCES image_blobs(hash)
+                )
+            """
+            )
             cursor.execute(
                 """
                 CREATE TABLE IF NOT EXISTS property_plots (
@@ -47,101 +318,742 @@ class PropertyDatabase:
                 )
             """
             )
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS locations (
+                    query TEXT PRIMARY KEY,
+                    location_ids TEXT,
+                    resolved_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            """
+            )
+            # Bulk ingest checkpoints: search pages already walked, and the
+            # listings they found. A listing is done once it is in properties.
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingest_pages (
+                    location_id TEXT,
+                    offset INTEGER,
+                    result_count INTEGER,
+                    fetched_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY(location_id, offset)
+                )
+            """
+            )
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingest_items (
+                    property_id TEXT PRIMARY KEY,
+                    location_id TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    error TEXT
+                )
+            """
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS ingest_items_location ON ingest_items(location_id)"
+            )
+            # Partial index over unused rows, ordered by rowid, for sampling
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS properties_unused ON properties(used) WHERE used = 0"
+            )
+            for name, columns in PROPERTY_INDEXES.items():
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {name} ON properties({columns})"
+                )
+            cursor.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS properties_spatial_key ON properties(spatial_key)"
+            )
+            self._create_spatial_index(cursor)
+            self._migrate_property_images(cursor)
             conn.commit()
 
-    def add_property(self, property_data: dict, images: list, plot_data: bytes = None):
-        with sqlite3.connect(self.db_path) as conn:
+    def _create_spatial_index(self, cursor):
+        """Create the R*Tree over property locations, filling it if new
+
+        Falls back to the (latitude, longitude) index when SQLite was built
+        without the rtree module.
+        """
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'property_locations'"
+        )
+        if cursor.fetchone():
+            return
+        try:
+            # One degenerate box per property, keyed by properties.spatial_key
+            cursor.execute(
+                """
+                CREATE VIRTUAL TABLE property_locations USING rtree(
+                    id,
+                    min_lat, max_lat,
+                    min_lon, max_lon
+                )
+            """
+            )
+        except sqlite3.OperationalError:
+            self.has_rtree = False
+            return
+        self._fill_spatial_index(cursor)
+
+    def _fill_spatial_index(self, cursor):
+        self._assign_spatial_keys(cursor)
+        cursor.execute(
+            "INSERT INTO property_locations SELECT spatial_key, latitude, latitude, longitude, longitude FROM properties WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        )
+
+    def _assign_spatial_keys(self, cursor):
+        """Give rows written without a spatial key the next free ones"""
+        cursor.execute("SELECT COALESCE(MAX(spatial_key), 0) FROM properties")
+        next_key = cursor.fetchone()[0] + 1
+        cursor.execute("SELECT id FROM properties WHERE spatial_key IS NULL")
+        cursor.executemany(
+            "UPDATE properties SET spatial_key = ? WHERE id = ?",
+            enumerate([row[0] for row in cursor.fetchall()], next_key),
+        )
+
+    def rebuild_spatial_index(self):
+        """Repopulate the R*Tree from the latitude/longitude columns
+
+        Rows inserted directly, without a spatial key, are given one first.
+        """
+        with self.connection() as conn:
             cursor = conn.cursor()
-            # Store property data
+            if self.has_rtree:
+                cursor.execute("DELETE FROM property_locations")
+                self._fill_spatial_index(cursor)
+            else:
+                self._assign_spatial_keys(cursor)
+            conn.commit()
+
+    def _migrate_property_columns(self, cursor):
+        """Add the typed columns to an old properties table and fill them in"""
+        cursor.execute("PRAGMA table_info(properties)")
+        existing = {row[1] for row in cursor.fetchall()}
+        missing = [name for name in PROPERTY_COLUMNS if name not in existing]
+        if not missing:
+            return
+        print("Adding typed property columns:", ", ".join(missing))
+        for name in missing:
+            cursor.execute(
+                f"ALTER TABLE properties ADD COLUMN {name} {PROPERTY_COLUMNS[name]}"
+            )
+        # Old rows keep scraped_at NULL: when they were fetched is unknown
+        rows = cursor.connection.execute("SELECT rowid, data FROM properties")
+        assignments = ", ".join(f"{name} = ?" for name in VALUE_COLUMNS)
+        cursor.executemany(
+            f"UPDATE properties SET {assignments} WHERE rowid = ?",
+            (
+                (*property_columns(json.loads(data)).values(), rowid)
+                for rowid, data in rows.fetchall()
+            ),
+        )
+
+    def _migrate_spatial_key(self, cursor):
+        """Key an old R*Tree on spatial_key instead of the implicit rowid"""
+        cursor.execute("PRAGMA table_info(properties)")
+        if "spatial_key" in {row[1] for row in cursor.fetchall()}:
+            return
+        print("Adding spatial keys to properties")
+        cursor.execute("ALTER TABLE properties ADD COLUMN spatial_key INTEGER")
+        self._assign_spatial_keys(cursor)
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'property_locations'"
+        )
+        if cursor.fetchone():
+            # Entries keyed by rowids from before a VACUUM may be stale
+            cursor.execute("DELETE FROM property_locations")
+            self._fill_spatial_index(cursor)
+
+    def _migrate_property_images(self, cursor):
+        """Move images from the old per-property table into image_blobs"""
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'property_images'"
+        )
+        if not cursor.fetchone():
+            return
+        print("Migrating property images to the content-addressed store...")
+        # Stream the old rows rather than loading every image at once
+        rows = cursor.connection.execute(
+            "SELECT property_id, image_index, image_data FROM property_images"
+        )
+        for property_id, image_index, image_data in rows:
+            digest = image_hash(image_data)
+            cursor.execute(
+                "INSERT OR IGNORE INTO image_blobs (hash, image_data, size) VALUES (?, ?, ?)",
+                (digest, image_data, len(image_data)),
+            )
+            cursor.execute(
+                "INSERT OR REPLACE INTO property_image_refs (property_id, image_index, image_hash) VALUES (?, ?, ?)",
+                (property_id, image_index, digest),
+            )
+        cursor.execute("DROP TABLE property_images")
+
+    def _insert_property(
+        self, cursor, property_data: dict, images: list, plot_data: bytes = None
+    ):
+        """Insert a property; images are raw bytes or StoredImage dicts"""
+        # Store property data, keeping the used flag and spatial key of a
+        # re-scraped property so played properties never return to the pool
+        columns = property_columns(property_data)
+        cursor.execute(
+            f"INSERT OR REPLACE INTO properties (id, data, used, spatial_key, {', '.join(VALUE_COLUMNS)}, scraped_at) VALUES (?, ?, COALESCE((SELECT used FROM properties WHERE id = ?), 0), COALESCE((SELECT spatial_key FROM properties WHERE id = ?), (SELECT COALESCE(MAX(spatial_key), 0) + 1 FROM properties)), {', '.join('?' * len(VALUE_COLUMNS))}, CURRENT_TIMESTAMP)",
+            (
+                property_data["id"],
+                json.dumps(property_data),
+                property_data["id"],
+                property_data["id"],
+                *columns.values(),
+            ),
+        )
+        print("Inserted property:", property_data["id"])
+        self._index_location(cursor, property_data["id"], columns)
+        self._insert_images(cursor, property_data["id"], images)
+
+        # Store plot
+        if plot_data:
             cursor.execute(
-                "INSERT OR REPLACE INTO properties (id, data) VALUES (?, ?)",
-                (property_data["id"], json.dumps(property_data)),
+                "INSERT OR REPLACE INTO property_plots (property_id, plot_data) VALUES (?, ?)",
+                (property_data["id"], plot_data),
             )
-            print("Inserted property:", property_data["id"])
-            # Store images
-            for idx, image_data in enumerate(images):
+
+    def _index_location(self, cursor, property_id: str, columns: dict):
+        """Replace a property's R*Tree entry with its current location"""
+        if not self.has_rtree:
+            return
+        cursor.execute(
+            "SELECT spatial_key FROM properties WHERE id = ?", (property_id,)
+        )
+        key = cursor.fetchone()[0]
+        cursor.execute("DELETE FROM property_locations WHERE id = ?", (key,))
+        latitude, longitude = columns["latitude"], columns["longitude"]
+        if latitude is not None and longitude is not None:
+            cursor.execute(
+                "INSERT INTO property_locations VALUES (?, ?, ?, ?, ?)",
+                (key, latitude, latitude, longitude, longitude),
+            )
+
+    def _insert_images(self, cursor, property_id: str, images: list):
+        """Point a property at images, writing bytes only for new hashes"""
+        cursor.execute(
+            "DELETE FROM property_image_refs WHERE property_id = ?",
+            (property_id,),
+        )
+        for idx, image in enumerate(images):
+            if isinstance(image, (bytes, bytearray)):
+                image = {"hash": image_hash(image), "data": image}
+            if image.get("data") is not None:
                 cursor.execute(
-                    "INSERT OR REPLACE INTO property_images (property_id, image_index, image_data) VALUES (?, ?, ?)",
-                    (property_data["id"], idx, image_data),
+                    "INSERT OR IGNORE INTO image_blobs (hash, image_data, size) VALUES (?, ?, ?)",
+                    (image["hash"], image["data"], len(image["data"])),
                 )
-
-            # Store plot
-            if plot_data:
+            for kind, rendition in (image.get("renditions") or {}).items():
+                cursor.execute(
+                    "INSERT OR IGNORE INTO image_renditions (image_hash, kind, max_edge, image_data, size) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        image["hash"],
+                        kind,
+                        RENDITION_SIZES[kind],
+                        rendition,
+                        len(rendition),
+                    ),
+                )
+            if image.get("url"):
                 cursor.execute(
-                    "INSERT OR REPLACE INTO property_plots (property_id, plot_data) VALUES (?, ?)",
-                    (property_data["id"], plot_data),
+                    "INSERT OR REPLACE INTO image_sources (url, image_hash) VALUES (?, ?)",
+                    (image["url"], image["hash"]),
                 )
+            cursor.execute(
+                "INSERT OR REPLACE INTO property_image_refs (property_id, image_index, image_hash) VALUES (?, ?, ?)",
+                (property_id, idx, image["hash"]),
+            )
 
+    def add_property(self, property_data: dict, images: list, plot_data: bytes = None):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            self._insert_property(cursor, property_data, images, plot_data)
             conn.commit()
 
-    def get_random_unused_properties(self, count=10):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            # Get random unused properties
-            cursor.execute(
-                "SELECT data FROM properties WHERE used = 0 ORDER BY RANDOM() LIMIT ?",
-                (count,),
-            )
-            results = cursor.fetchall()
-            if results:
-                properties = []
-                for (data,) in results:
-                    property_data = json.loads(data)
-                    # Get images for this property
-                    cursor.execute(
-                        "SELECT image_data FROM property_images WHERE property_id = ? ORDER BY image_index",
-                        (property_data["id"],),
-                    )
-                    images = [row[0] for row in cursor.fetchall()]
-
-                    # Get plot for this property
-                    cursor.execute(
-                        "SELECT plot_data FROM property_plots WHERE property_id = ?",
-                        (property_data["id"],),
-                    )
-                    plot_data = cursor.fetchone()
-                    plot = plot_data[0] if plot_data else None
-
-                    properties.append((property_data, images, plot))
-
-                # Mark these properties as used
+    def add_properties(self, records: list):
+        """Insert (property_data, images, plot_data) records in one transaction"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for property_data, images, plot_data in records:
+                self._insert_property(cursor, property_data, images, plot_data)
+            conn.commit()
+
+    def properties_to_refresh(
+        self, limit: Optional[int] = None, older_than_days: float = 0
+    ) -> List[dict]:
+        """Stored column values of properties least recently scraped or refreshed"""
+        columns = ["id", *VALUE_COLUMNS]
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {', '.join(columns)} FROM properties WHERE COALESCE(refreshed_at, scraped_at, '') <= datetime('now', ?) ORDER BY COALESCE(refreshed_at, scraped_at, '') LIMIT ?",
+                (f"-{older_than_days} days", -1 if limit is None else limit),
+            )
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def apply_refresh(self, unchanged_ids: list, updates: list) -> int:
+        """Record a refresh pass in one transaction; returns columns written
+
+        updates are (stored, property_data, images) where stored is a row
+        from properties_to_refresh and images is None when the photo URLs
+        are unchanged. Only columns whose value changed are written, and
+        status_changed_at is set when available or archived changed.
+        """
+        written = 0
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "UPDATE properties SET refreshed_at = CURRENT_TIMESTAMP WHERE id = ?",
+                [(property_id,) for property_id in unchanged_ids],
+            )
+            for stored, property_data, images in updates:
+                columns = property_columns(property_data)
+                changed = {
+                    name: value
+                    for name, value in columns.items()
+                    if value != stored[name]
+                }
+                assignments = [f"{name} = ?" for name in changed]
+                params = list(changed.values())
+                if "content_hash" in changed or "photos_hash" in changed:
+                    assignments.append("data = ?")
+                    params.append(json.dumps(property_data))
+                if "available" in changed or "archived" in changed:
+                    assignments.append("status_changed_at = CURRENT_TIMESTAMP")
+                assignments.append("refreshed_at = CURRENT_TIMESTAMP")
                 cursor.execute(
-                    "UPDATE properties SET used = 1 WHERE data IN ({})".format(
-                        ",".join("?" * len(results))
-                    ),
-                    [result[0] for result in results],
+                    f"UPDATE properties SET {', '.join(assignments)} WHERE id = ?",
+                    (*params, stored["id"]),
                 )
-                conn.commit()
-                return properties
+                written += len(params)
+                if "latitude" in changed or "longitude" in changed:
+                    self._index_location(cursor, stored["id"], columns)
+                if images is not None:
+                    self._insert_images(cursor, stored["id"], images)
+            conn.commit()
+        return written
+
+    def _sample_unused_rows(self, cursor, count: int, filters=None):
+        """Pick up to count uniformly random unused (rowid, data) rows
+
+        Counts the matching unused rows and draws distinct positions among
+        them, so every unused row is equally likely however the rowids are
+        spread. The positions are walked in order along the partial index,
+        each OFFSET continuing from the previous pick, so the cost is one
+        pass over the unused rowids rather than a full-table sort. Filters
+        are applied to the typed columns, never the JSON.
+        """
+        where, params = filter_clause(filters or {})
+        cursor.execute(f"SELECT COUNT(*) FROM properties WHERE used = 0{where}", params)
+        total = cursor.fetchone()[0]
+        rowids = []
+        previous, rowid = -1, 0
+        for position in sorted(random.sample(range(total), min(count, total))):
+            cursor.execute(
+                f"SELECT rowid FROM properties WHERE used = 0{where} AND rowid > ? ORDER BY rowid LIMIT 1 OFFSET ?",
+                (*params, rowid, position - previous - 1),
+            )
+            rowid = cursor.fetchone()[0]
+            rowids.append(rowid)
+            previous = position
+        if not rowids:
             return []
 
+        cursor.execute(
+            f"SELECT rowid, data FROM properties WHERE rowid IN ({','.join('?' * len(rowids))})",
+            rowids,
+        )
+        sample = cursor.fetchall()
+        random.shuffle(sample)
+        return sample
+
+    def get_random_unused_properties(self, count=10, **filters):
+        """Pick random unused properties as PropertyHandles and mark them used
+
+        Keyword filters (see PropertyFilter) narrow the choice, for example
+        city="leeds", min_bedrooms=3, max_price=300000.
+        """
+        conn = self.connection()
+        with conn:
+            # Take the write lock up front so concurrent callers never
+            # hand out the same unused properties
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.cursor()
+            results = self._sample_unused_rows(cursor, count, filters)
+            if not results:
+                return []
+
+            properties = [json.loads(data) for _, data in results]
+            ids = [property_data["id"] for property_data in properties]
+            placeholders = ",".join("?" * len(ids))
+
+            # Locate every image and plot in two queries; the bytes are only
+            # read when a handle asks for them
+            image_hashes = {property_id: [] for property_id in ids}
+            cursor.execute(
+                f"SELECT property_id, image_hash FROM property_image_refs WHERE property_id IN ({placeholders}) ORDER BY property_id, image_index",
+                ids,
+            )
+            for property_id, digest in cursor.fetchall():
+                image_hashes[property_id].append(digest)
+
+            cursor.execute(
+                f"SELECT property_id FROM property_plots WHERE property_id IN ({placeholders})",
+                ids,
+            )
+            with_plots = {property_id for (property_id,) in cursor.fetchall()}
+
+            # Mark these properties as used, by rowid, in the same transaction
+            cursor.executemany(
+                "UPDATE properties SET used = 1 WHERE rowid = ?",
+                [(rowid,) for rowid, _ in results],
+            )
+            return [
+                PropertyHandle(
+                    self,
+                    property_data,
+                    image_hashes[property_data["id"]],
+                    property_data["id"] in with_plots,
+                )
+                for property_data in properties
+            ]
+
+    def _bbox_rows(
+        self, cursor, min_lat, max_lat, min_lon, max_lon, unused_only=False
+    ) -> List[Tuple[int, float, float]]:
+        """(spatial_key, latitude, longitude) of properties inside a bounding box"""
+        used = " AND p.used = 0" if unused_only else ""
+        if self.has_rtree:
+            # R*Tree boxes are rounded outwards to float32, so test overlap
+            # and re-check against the exact columns
+            cursor.execute(
+                f"SELECT p.spatial_key, p.latitude, p.longitude FROM property_locations r JOIN properties p ON p.spatial_key = r.id WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?{used}",
+                (min_lat, max_lat, min_lon, max_lon),
+            )
+        else:
+            cursor.execute(
+                f"SELECT p.spatial_key, p.latitude, p.longitude FROM properties p WHERE p.latitude BETWEEN ? AND ? AND p.longitude BETWEEN ? AND ?{used}",
+                (min_lat, max_lat, min_lon, max_lon),
+            )
+        return [
+            row
+            for row in cursor.fetchall()
+            if min_lat <= row[1] <= max_lat and min_lon <= row[2] <= max_lon
+        ]
+
+    def _load_rows(self, cursor, keys: List[int]) -> List[dict]:
+        """Property data for spatial keys, in the same order"""
+        data = {}
+        for start in range(0, len(keys), MAX_QUERY_PARAMS):
+            chunk = keys[start : start + MAX_QUERY_PARAMS]
+            cursor.execute(
+                f"SELECT spatial_key, data FROM properties WHERE spatial_key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            data.update(cursor.fetchall())
+        return [json.loads(data[key]) for key in keys]
+
+    def properties_in_bbox(
+        self,
+        min_lat: float,
+        max_lat: float,
+        min_lon: float,
+        max_lon: float,
+        unused_only: bool = False,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        """Properties whose location lies inside a latitude/longitude box"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            rows = self._bbox_rows(
+                cursor, min_lat, max_lat, min_lon, max_lon, unused_only
+            )
+            return self._load_rows(cursor, [row[0] for row in rows[:limit]])
+
+    def properties_within(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        unused_only: bool = False,
+    ) -> List[Tuple[float, dict]]:
+        """(distance_km, property) pairs within radius_km, nearest first"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            rows = self._bbox_rows(
+                cursor, *radius_bbox(latitude, longitude, radius_km), unused_only
+            )
+            matches = sorted(
+                (haversine_km(latitude, longitude, lat, lon), key)
+                for key, lat, lon in rows
+            )
+            matches = [match for match in matches if match[0] <= radius_km]
+            return list(
+                zip(
+                    [distance for distance, _ in matches],
+                    self._load_rows(cursor, [key for _, key in matches]),
+                )
+            )
+
+    def nearest_properties(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int = 10,
+        unused_only: bool = False,
+    ) -> List[Tuple[float, dict]]:
+        """The k nearest (distance_km, property) pairs, nearest first
+
+        Searches a growing radius so only nearby rows are read: a match is
+        only certain once it lies within the radius searched so far.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            radius = NEAREST_START_KM
+            while True:
+                rows = self._bbox_rows(
+                    cursor, *radius_bbox(latitude, longitude, radius), unused_only
+                )
+                matches = sorted(
+                    (haversine_km(latitude, longitude, lat, lon), key)
+                    for key, lat, lon in rows
+                )
+                within = [match for match in matches if match[0] <= radius]
+                if len(within) >= k or radius >= NEAREST_MAX_KM:
+                    break
+                radius *= 2
+            nearest = (within if len(within) >= k else matches)[:k]
+            return list(
+                zip(
+                    [distance for distance, _ in nearest],
+                    self._load_rows(cursor, [key for _, key in nearest]),
+                )
+            )
+
+    def read_image(self, digest: str, max_edge: Optional[int] = None) -> bytes:
+        """Read the smallest stored rendition covering max_edge, else the original"""
+        image_data = None
+        if max_edge:
+            image_data = self.read_blob(
+                "image_renditions",
+                "image_data",
+                "image_hash = ? AND max_edge >= ? ORDER BY max_edge LIMIT 1",
+                (digest, max_edge),
+            )
+        if image_data is None:
+            image_data = self.read_blob(
+                "image_blobs", "image_data", "hash = ?", (digest,)
+            )
+        return image_data
+
+    def read_blob(self, table: str, column: str, condition: str, params) -> bytes:
+        """Read the BLOB of the first row matching condition, or None
+
+        The implicit rowid is looked up in the same read transaction as the
+        read, since VACUUM and INSERT OR REPLACE can change it at any time.
+        Uses incremental BLOB I/O when available.
+        """
+        conn = self.connection()
+        own_transaction = not conn.in_transaction
+        if own_transaction:
+            conn.execute("BEGIN")
+        try:
+            row = conn.execute(
+                f"SELECT rowid FROM {table} WHERE {condition}", params
+            ).fetchone()
+            if row is None:
+                return None
+            if hasattr(conn, "blobopen"):
+                with conn.blobopen(table, column, row[0], readonly=True) as blob:
+                    return blob.read()
+            return conn.execute(
+                f"SELECT {column} FROM {table} WHERE rowid = ?", (row[0],)
+            ).fetchone()[0]
+        finally:
+            if own_transaction:
+                conn.commit()
+
     def reset_used_status(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("UPDATE properties SET used = 0")
             conn.commit()
 
-    def count_properties(self):
-        with sqlite3.connect(self.db_path) as conn:
+    def count_properties(self, unused_only: bool = False, **filters):
+        """Count stored properties, optionally only unused ones matching filters"""
+        where, params = filter_clause(filters)
+        if unused_only:
+            where = " AND used = 0" + where
+        with self.connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM properties")
+            cursor.execute(f"SELECT COUNT(*) FROM properties WHERE 1{where}", params)
             return cursor.fetchone()[0]
 
-    def get_property_images(self, property_id):
-        with sqlite3.connect(self.db_path) as conn:
+    def get_image_hash_for_url(self, url: str):
+        """Hash of the stored image previously downloaded from url, if any"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT s.image_hash FROM image_sources s JOIN image_blobs b ON b.hash = s.image_hash WHERE s.url = ?",
+                (url,),
+            )
+            result = cursor.fetchone()
+            return result[0] if result else None
+
+    def has_image(self, digest: str) -> bool:
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM image_blobs WHERE hash = ?", (digest,))
+            return cursor.fetchone() is not None
+
+    def image_storage_report(self) -> dict:
+        """Compare bytes stored in image_blobs with bytes referenced by properties"""
+        with self.connection() as conn:
             cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM image_blobs")
+            unique_images, stored_bytes = cursor.fetchone()
             cursor.execute(
-                "SELECT image_data FROM property_images WHERE property_id = ? ORDER BY image_index",
-                (property_id,),
+                "SELECT COUNT(*), COALESCE(SUM(b.size), 0) FROM property_image_refs r JOIN image_blobs b ON b.hash = r.image_hash"
             )
-            return [row[0] for row in cursor.fetchall()]
+            references, referenced_bytes = cursor.fetchone()
+            return {
+                "unique_images": unique_images,
+                "references": references,
+                "stored_bytes": stored_bytes,
+                "referenced_bytes": referenced_bytes,
+                "saved_bytes": referenced_bytes - stored_bytes,
+            }
 
     def get_property_plot(self, property_id):
-        with sqlite3.connect(self.db_path) as conn:
+        return self.read_blob(
+            "property_plots", "plot_data", "property_id = ?", (property_id,)
+        )
+
+    def get_location_ids(self, query: str):
+        """Return stored Rightmove location identifiers for a search query"""
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "SELECT plot_data FROM property_plots WHERE property_id = ?",
-                (property_id,),
+                "SELECT location_ids FROM locations WHERE query = ?", (query,)
             )
             result = cursor.fetchone()
-            return result[0] if result else None
+            return json.loads(result[0]) if result else None
+
+    def save_location_ids(self, query: str, location_ids: list):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT OR REPLACE INTO locations (query, location_ids) VALUES (?, ?)",
+                (query, json.dumps(location_ids)),
+            )
+            conn.commit()
+
+    def get_ingest_pages(self, location_id: str) -> Dict[int, int]:
+        """Search offsets already walked for a location, with its result count"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT offset, result_count FROM ingest_pages WHERE location_id = ?",
+                (location_id,),
+            )
+            return dict(cursor.fetchall())
+
+    def save_ingest_page(
+        self, location_id: str, offset: int, result_count: int, property_ids: list
+    ):
+        """Checkpoint a search page and the listings it found"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT OR IGNORE INTO ingest_items (property_id, location_id) VALUES (?, ?)",
+                [(property_id, location_id) for property_id in property_ids],
+            )
+            cursor.execute(
+                "INSERT OR REPLACE INTO ingest_pages (location_id, offset, result_count) VALUES (?, ?, ?)",
+                (location_id, offset, result_count),
+            )
+            conn.commit()
+
+    def pending_ingest_items(
+        self, location_ids: list, max_attempts: int, property_ids: list = None
+    ) -> List[Tuple[str, str]]:
+        """(property_id, location_id) of listings not yet stored or given up on
+
+        Limited to property_ids when given, in that order.
+        """
+        query = "SELECT i.property_id, i.location_id FROM ingest_items i WHERE i.attempts < ? AND NOT EXISTS (SELECT 1 FROM properties p WHERE p.id = i.property_id)"
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if property_ids is not None:
+                cursor.execute(
+                    f"{query} AND i.property_id IN ({','.join('?' * len(property_ids))})",
+                    (max_attempts, *property_ids),
+                )
+                pending = dict(cursor.fetchall())
+                return [
+                    (property_id, pending[property_id])
+                    for property_id in property_ids
+                    if property_id in pending
+                ]
+            cursor.execute(
+                f"{query} AND i.location_id IN ({','.join('?' * len(location_ids))}) ORDER BY i.rowid",
+                (max_attempts, *location_ids),
+            )
+            return cursor.fetchall()
+
+    def count_ingested(self, location_ids: list) -> int:
+        """Listings found for these locations that are stored as properties"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT COUNT(*) FROM ingest_items i JOIN properties p ON p.id = i.property_id WHERE i.location_id IN ({','.join('?' * len(location_ids))})",
+                location_ids,
+            )
+            return cursor.fetchone()[0]
+
+    def record_ingest_failure(self, property_id: str, error: str):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE ingest_items SET attempts = attempts + 1, error = ? WHERE property_id = ?",
+                (error, property_id),
+            )
+            conn.commit()
+
+    def clear_ingest_checkpoints(self):
+        """Forget walked pages and failed listings; stored properties stay"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM ingest_pages")
+            cursor.execute("DELETE FROM ingest_items")
+            conn.commit()
+
+
+class PropertyHandle:
+    """A property's data, with its images and plot read from the database on demand"""
+
+    def __init__(self, db: PropertyDatabase, data: dict, image_hashes, has_plot):
+        self.db = db
+        self.data = data
+        self.image_hashes = image_hashes
+        self.has_plot = has_plot
+
+    @property
+    def id(self):
+        return self.data["id"]
+
+    @property
+    def image_count(self) -> int:
+        return len(self.image_hashes)
+
+    def image(self, index: int, max_edge: Optional[int] = None) -> bytes:
+        """Image bytes, as the smallest rendition at least max_edge pixels wide"""
+        return self.db.read_image(self.image_hashes[index], max_edge)
+
+    def plot(self):
+        if not self.has_plot:
+            return None
+        return self.db.get_property_plot(self.id)
@@ -0,0 +1,115 @@
+"""Compact binary storage for the UK map polygons.
+
+Layout of a polygon file:
+
+    MAGIC (8 bytes) | header length (uint32 LE) | JSON header | padding |
+    per level: float32 (x, y) coordinates, then int64 ring offsets
+
+The JSON header holds the plot bounds and, for each level of detail, its
+simplification tolerance and the byte offsets of its two buffers. Buffers
+are 16-byte aligned so they can be mapped directly with numpy.memmap.
+Ring i of a level spans coordinates[offsets[i]:offsets[i + 1]].
+"""
+
+import json
+import struct
+from typing import Dict, List
+
+import numpy as np
+
+MAGIC = b"UKPOLY1\n"
+ALIGNMENT = 16
+
+
+def _aligned(position: int) -> int:
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+def write_polygon_file(path: str, levels: Dict[str, dict], bounds: dict):
+    """Write levels {name: {"tolerance": float, "rings": [array]}} to path"""
+    buffers = []
+    header = {"bounds": bounds, "levels": {}}
+    for name, level in levels.items():
+        rings = [
+            np.asarray(ring, dtype=np.float32).reshape(-1, 2) for ring in level["rings"]
+        ]
+        offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(ring) for ring in rings])
+        coords = np.concatenate(rings) if rings else np.zeros((0, 2), dtype=np.float32)
+        header["levels"][name] = {
+            "tolerance": level["tolerance"],
+            "num_points": int(offsets[-1]),
+            "num_rings": len(rings),
+        }
+        buffers.append((name, coords, offsets))
+
+    # Offsets depend on the header size, which depends on the offsets, so
+    # lay the buffers out after a header padded to a fixed upper bound
+    header_bytes = json.dumps(header).encode()
+    reserve = len(header_bytes) + 64 * (len(levels) + 1)
+    position = _aligned(len(MAGIC) + 4 + reserve)
+    for name, coords, offsets in buffers:
+        entry = header["levels"][name]
+        entry["coords_offset"] = position
+        position = _aligned(position + coords.nbytes)
+        entry["offsets_offset"] = position
+        position = _aligned(position + offsets.nbytes)
+    header_bytes = json.dumps(header).encode()
+    assert len(header_bytes) <= reserve
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for name, coords, offsets in buffers:
+            entry = header["levels"][name]
+            f.write(b"\0" * (entry["coords_offset"] - f.tell()))
+            f.write(coords.astype("<f4").tobytes())
+            f.write(b"\0" * (entry["offsets_offset"] - f.tell()))
+            f.write(offsets.astype("<i8").tobytes())
+
+
+class PolygonFile:
+    """Memory-mapped view of a polygon file"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a polygon file")
+            (header_length,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_length))
+        self.path = path
+        self.bounds = header["bounds"]
+        self.levels = header["levels"]
+
+    def level_names(self) -> List[str]:
+        return list(self.levels)
+
+    def coordinates(self, level: str):
+        """(num_points, 2) float32 array of every ring's points"""
+        entry = self.levels[level]
+        if not entry["num_points"]:
+            return np.zeros((0, 2), dtype=np.float32)
+        return np.memmap(
+            self.path,
+            dtype="<f4",
+            mode="r",
+            offset=entry["coords_offset"],
+            shape=(entry["num_points"], 2),
+        )
+
+    def ring_offsets(self, level: str):
+        entry = self.levels[level]
+        return np.memmap(
+            self.path,
+            dtype="<i8",
+            mode="r",
+            offset=entry["offsets_offset"],
+            shape=(entry["num_rings"] + 1,),
+        )
+
+    def rings(self, level: str) -> List[np.ndarray]:
+        """Views of each ring's (n, 2) coordinates, without copying"""
+        coords = self.coordinates(level)
+        offsets = self.ring_offsets(level)
+        return [coords[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
@@ -0,0 +1,281 @@
+"""Record rightmove responses to disk and serve them back without the network.
+
+A Recording is a SQLite file of responses keyed by URL, filled by fetch_url
+when a scrape session is given record=. It can then be replayed in process
+through ReplayTransport, or served by StandinServer, a local HTTP server
+that adds configurable latency, random errors and throttling so the
+scraper's concurrency and retries can be load tested deterministically.
+Requests reach the stand-in through StandinTransport, which sends every
+URL to the server with the original URL in the X-Original-URL header.
+"""
+
+import random
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, TypedDict
+
+from httpx import URL, AsyncBaseTransport, AsyncHTTPTransport, Request, Response
+
+ORIGINAL_URL_HEADER = "X-Original-URL"
+# Status the stand-in and replay answer with for URLs that were not recorded
+MISSING_STATUS = 404
+
+
+class RecordedResponse(TypedDict):
+    url: str
+    status: int
+    body: bytes
+    encoding: Optional[str]
+
+
+def recording_key(url: str) -> str:
+    """URL as httpx sends it, so fetch_url's and the transport's forms match"""
+    return str(URL(url))
+
+
+class Recording:
+    """Captured responses keyed by URL, safe to share between threads"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS recorded_responses (
+                url TEXT PRIMARY KEY,
+                status INTEGER,
+                body BLOB,
+                encoding TEXT,
+                recorded_at REAL
+            )
+        """
+        )
+        self.conn.commit()
+
+        self.recorded = 0
+        self.served = 0
+        self.missing = 0
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM recorded_responses"
+            ).fetchone()[0]
+
+    def record(self, url: str, status: int, body: bytes, encoding: Optional[str]):
+        """Store the latest response seen for url"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO recorded_responses VALUES (?, ?, ?, ?, ?)",
+                (recording_key(url), status, body, encoding, time.time()),
+            )
+            self.conn.commit()
+            self.recorded += 1
+
+    def get(self, url: str) -> Optional[RecordedResponse]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT status, body, encoding FROM recorded_responses WHERE url = ?",
+                (recording_key(url),),
+            ).fetchone()
+            if row is None:
+                self.missing += 1
+                return None
+            self.served += 1
+        status, body, encoding = row
+        return {"url": url, "status": status, "body": body, "encoding": encoding}
+
+    def summary(self) -> str:
+        return (
+            f"Recording: {self.recorded} recorded, {self.served} served, "
+            f"{self.missing} missing, {len(self)} entries"
+        )
+
+    def close(self):
+        self.conn.close()
+
+
+def content_type(recorded: RecordedResponse) -> str:
+    if recorded["encoding"]:
+        return f"text/html; charset={recorded['encoding']}"
+    return "application/octet-stream"
+
+
+class ReplayTransport(AsyncBaseTransport):
+    """Answer every request from a recording, in process"""
+
+    def __init__(self, recording: Recording):
+        self.recording = recording
+
+    async def handle_async_request(self, request: Request) -> Response:
+        recorded = self.recording.get(str(request.url))
+        if recorded is None:
+            return Response(MISSING_STATUS, request=request)
+        return Response(
+            recorded["status"],
+            headers={"Content-Type": content_type(recorded)},
+            content=recorded["body"],
+            request=request,
+        )
+
+
+class StandinTransport(AsyncBaseTransport):
+    """Send every request to a stand-in server instead of its real host"""
+
+    def __init__(self, server_url: str, **transport_options):
+        self.server_url = server_url.rstrip("/")
+        self.transport = AsyncHTTPTransport(**transport_options)
+
+    async def handle_async_request(self, request: Request) -> Response:
+        headers = dict(request.headers)
+        headers.pop("host", None)
+        headers[ORIGINAL_URL_HEADER] = str(request.url)
+        standin_request = Request(
+            request.method, self.server_url + "/", headers=headers
+        )
+        response = await self.transport.handle_async_request(standin_request)
+        response.request = request
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class StandinServer:
+    """Serve a recording over local HTTP with injected latency and faults
+
+    latency seconds are added to every response, plus up to jitter more.
+    error_rate is the chance of answering 503 instead, and with rate set,
+    requests beyond rate per second (bursts of burst) get 429 and a
+    Retry-After. Faults come from a seeded generator, so the same seed and
+    request order reproduce them.
+    """
+
+    def __init__(
+        self,
+        recording: Recording,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        seed: Optional[int] = 0,
+    ):
+        self.recording = recording
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate = rate
+        self.bucket_capacity = burst or rate or 0
+        self.tokens = self.bucket_capacity
+        self.updated = time.monotonic()
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.thread = None
+
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.missing = 0
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _take_token(self) -> bool:
+        """Token bucket like request_scheduler's, refusing instead of waiting"""
+        now = time.monotonic()
+        self.tokens = min(
+            self.bucket_capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def _fault(self) -> Optional[int]:
+        with self.lock:
+            self.requests += 1
+            if self.rate and not self._take_token():
+                self.throttled += 1
+                return 429
+            if self.random.random() < self.error_rate:
+                self.errors += 1
+                return 503
+            return None
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        delay = self.latency
+        if self.jitter:
+            with self.lock:
+                delay += self.random.uniform(0, self.jitter)
+        time.sleep(delay)
+
+        status = self._fault()
+        if status is not None:
+            headers = {"Retry-After": "1"} if status == 429 else {}
+            self._respond(request, status, b"", "text/plain", headers)
+            return
+
+        url = request.headers.get(ORIGINAL_URL_HEADER)
+        recorded = self.recording.get(url) if url else None
+        if recorded is None:
+            with self.lock:
+                self.missing += 1
+            self._respond(request, MISSING_STATUS, b"", "text/plain")
+            return
+        self._respond(
+            request, recorded["status"], recorded["body"], content_type(recorded)
+        )
+
+    @staticmethod
+    def _respond(request, status, body, mime, headers=None):
+        request.send_response(status)
+        request.send_header("Content-Type", mime)
+        request.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self) -> "StandinServer":
+        """Serve from a background thread"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def summary(self) -> str:
+        return (
+            f"Stand-in: {self.requests} requests, {self.errors} injected errors, "
+            f"{self.throttled} throttled, {self.missing} not recorded"
+        )
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+from typing import Callable, Optional
+
+from data_getter import generate_random_properties, scrape_session
+from database import PropertyDatabase
+from request_scheduler import RequestScheduler
+
+# Start fetching when fewer than LOW_WATER_MARK properties are unused and
+# keep fetching batches until HIGH_WATER_MARK are
+LOW_WATER_MARK = 30
+HIGH_WATER_MARK = 50
+# generate_random_properties takes one property per city, so at most 20
+MAX_BATCH = 10
+# Seconds between pool checks when it is full, and between batches
+POLL_INTERVAL = 60.0
+BATCH_COOLDOWN = 5.0
+# Backoff after a batch fails or saves nothing
+ERROR_BACKOFF = 30.0
+MAX_BACKOFF = 600.0
+# Gentler than an interactive scrape, since it runs while the game is played
+REPLENISH_RATE = 1.0
+REPLENISH_CONCURRENCY = 4
+
+
+class PropertyReplenisher:
+    """Keep the unused property pool topped up from a background thread
+
+    One thread runs one event loop holding a single scrape session (HTTP
+    client, throttled scheduler and response cache) for its lifetime.
+    Callbacks are called from that thread.
+    """
+
+    def __init__(
+        self,
+        db: PropertyDatabase,
+        low_water: int = LOW_WATER_MARK,
+        high_water: int = HIGH_WATER_MARK,
+        progress_callback: Optional[Callable] = None,
+        on_replenished: Optional[Callable[[int, int], None]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ):
+        self.db = db
+        self.low_water = low_water
+        self.high_water = max(high_water, low_water)
+        self.progress_callback = progress_callback
+        self.on_replenished = on_replenished
+        self.on_error = on_error
+
+        self.loop = None
+        self.task = None
+        self.thread = None
+        self._wake = None
+        self._force = False
+        self.filling = False
+        self._ready = threading.Event()
+        self.failures = 0
+        self.batches = 0
+        self.saved = 0
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """Start the replenishing thread if it is not already running"""
+        if self.running:
+            return
+        self._ready.clear()
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.thread.start()
+        self._ready.wait()
+
+    def stop(self, timeout: float = 5.0):
+        """Cancel the replenisher and wait for its thread to finish"""
+        if not self.running:
+            return
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join(timeout)
+
+    def wake(self, force: bool = False):
+        """Check the pool now; with force, fetch a batch even if it is full"""
+        if not self.running:
+            return
+        if force:
+            self._force = True
+        self.loop.call_soon_threadsafe(self._wake.set)
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._wake = asyncio.Event()
+        self.task = self.loop.create_task(self.run())
+        self._ready.set()
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            # Let pipeline tasks still in flight see the cancellation
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(
+                asyncio.gather(*pending, return_exceptions=True)
+            )
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    async def run(self):
+        """Top up the pool whenever it falls below the low-water mark"""
+        scheduler = RequestScheduler(
+            max_concurrency=REPLENISH_CONCURRENCY, rate=REPLENISH_RATE
+        )
+        async with scrape_session(scheduler=scheduler):
+            delay = 0.0
+            while True:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                delay = await self.replenish()
+
+    async def replenish(self) -> float:
+        """Fetch one batch if needed; return the seconds until the next check
+
+        Falling below the low-water mark starts filling, which carries on a
+        batch at a time until the high-water mark is reached.
+        """
+        force, self._force = self._force, False
+        unused = self.db.count_properties(unused_only=True)
+        if unused < self.low_water:
+            self.filling = True
+        elif unused >= self.high_water:
+            self.filling = False
+        if not self.filling and not force:
+            return POLL_INTERVAL
+
+        batch = min(MAX_BATCH, max(self.high_water - unused, 1))
+        try:
+            saved = await generate_random_properties(
+                batch, self.db, self.progress_callback
+            )
+        except Exception as e:
+            print(f"Error replenishing properties: {str(e)}")
+            saved = []
+            if self.on_error:
+                self.on_error(e)
+
+        self.batches += 1
+        self.saved += len(saved)
+        if self.on_replenished:
+            self.on_replenished(len(saved), self.db.count_properties(unused_only=True))
+        if not saved:
+            self.failures += 1
+            return min(ERROR_BACKOFF * 2 ** (self.failures - 1), MAX_BACKOFF)
+        self.failures = 0
+        return BATCH_COOLDOWN
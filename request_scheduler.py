@@ -0,0 +1,195 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, TypedDict
+from urllib.parse import urlsplit
+
+from httpx import AsyncClient, HTTPStatusError, Response, TransportError
+
+# Responses worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SchedulerStats(TypedDict):
+    queued: int
+    max_queued: int
+    in_flight: int
+    requests: int
+    retries: int
+    failures: int
+    total_wait: float
+    max_wait: float
+    avg_wait: float
+    retries_by_status: dict
+
+
+class TokenBucket:
+    """Token bucket allowing `rate` requests per second with bursts of `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class RequestScheduler:
+    """Bound concurrency, rate limit per host and retry throttled requests"""
+
+    def __init__(
+        self,
+        max_concurrency: int = 10,
+        per_host_concurrency: int = 4,
+        rate: float = 5.0,
+        burst: float = 10.0,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._global_slots = asyncio.Semaphore(max_concurrency)
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._host_buckets: Dict[str, TokenBucket] = {}
+
+        self.queued = 0
+        self.max_queued = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.retries_by_status: Dict[str, int] = defaultdict(int)
+
+    def _host_limits(self, host: str):
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.per_host_concurrency)
+            self._host_buckets[host] = TokenBucket(self.rate, self.burst)
+        return self._host_slots[host], self._host_buckets[host]
+
+    def _backoff(self, attempt: int, response: Optional[Response] = None) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when present"""
+        delay = random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2**attempt)
+        )
+        retry_after = response.headers.get("Retry-After") if response else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                try:
+                    wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    delay = max(delay, wait)
+                except (TypeError, ValueError):
+                    pass
+        return min(delay, self.backoff_max)
+
+    async def _send(self, client: AsyncClient, url: str, **kwargs) -> Response:
+        """Send one attempt once a global slot, a host slot and a token are free"""
+        host_slots, bucket = self._host_limits(urlsplit(url).netloc)
+
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        started = time.monotonic()
+        try:
+            await self._global_slots.acquire()
+            try:
+                await host_slots.acquire()
+            except BaseException:
+                self._global_slots.release()
+                raise
+        finally:
+            self.queued -= 1
+
+        try:
+            await bucket.acquire()
+            waited = time.monotonic() - started
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            self.requests += 1
+            self.in_flight += 1
+            try:
+                return await client.get(url, **kwargs)
+            finally:
+                self.in_flight -= 1
+        finally:
+            host_slots.release()
+            self._global_slots.release()
+
+    async def fetch(self, client: AsyncClient, url: str, **kwargs) -> Response:
+        """Fetch URL, retrying 429/5xx responses and transport errors"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._send(client, url, **kwargs)
+            except TransportError:
+                if attempt == self.max_retries:
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                self.retries_by_status["transport"] += 1
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            if attempt == self.max_retries:
+                break
+            self.retries += 1
+            self.retries_by_status[str(response.status_code)] += 1
+            await asyncio.sleep(self._backoff(attempt, response))
+
+        self.failures += 1
+        raise HTTPStatusError(
+            f"Giving up on {url} after {self.max_retries} retries "
+            f"(status {response.status_code})",
+            request=response.request,
+            response=response,
+        )
+
+    def stats(self) -> SchedulerStats:
+        """Snapshot of queue depth, wait times and retry counts"""
+        return {
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "total_wait": self.total_wait,
+            "max_wait": self.max_wait,
+            "avg_wait": self.total_wait / self.requests if self.requests else 0.0,
+            "retries_by_status": dict(self.retries_by_status),
+        }
+
+    def summary(self) -> str:
+        """One-line human readable summary of the scheduler stats"""
+        s = self.stats()
+        return (
+            f"Scheduler: {s['requests']} requests, {s['retries']} retries, "
+            f"{s['failures']} failures, max queue {s['max_queued']}, "
+            f"avg wait {s['avg_wait']:.2f}s, max wait {s['max_wait']:.2f}s"
+        )
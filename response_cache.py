@@ -0,0 +1,223 @@
+import os
+import sqlite3
+import time
+from typing import List, Optional, Tuple, TypedDict
+
+from httpx import Response
+
+DAY = 24 * 60 * 60
+
+# Time-to-live in seconds by URL substring; the first match wins and None
+# means the entry never expires. Image CDN URLs are content addressed.
+CACHE_TTLS: List[Tuple[str, Optional[float]]] = [
+    ("/typeAhead/", 30 * DAY),
+    ("/api/_search", 10 * 60),
+    ("media.rightmove.co.uk", None),
+    ("/properties/", DAY),
+]
+DEFAULT_TTL = 60 * 60
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+
+class CachedResponse(TypedDict):
+    url: str
+    body: bytes
+    encoding: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    expires_at: Optional[float]
+
+
+class CacheStats(TypedDict):
+    hits: int
+    misses: int
+    revalidated: int
+    stored: int
+    evicted: int
+    entries: int
+    size: int
+
+
+def ttl_for(url: str, ttls=CACHE_TTLS, default=DEFAULT_TTL) -> Optional[float]:
+    """Return the time-to-live for a URL from the per-endpoint table"""
+    for pattern, ttl in ttls:
+        if pattern in url:
+            return ttl
+    return default
+
+
+class ResponseCache:
+    """On-disk HTTP response cache keyed by URL, with LRU size bound"""
+
+    def __init__(self, cache_path=None, max_bytes: int = MAX_CACHE_BYTES):
+        if cache_path is None:
+            cache_path = os.path.join(os.environ["HOME"], "http_cache.db")
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB,
+                encoding TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                expires_at REAL,
+                last_access REAL,
+                size INTEGER
+            )
+        """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)"
+        )
+        self.conn.commit()
+        self.size = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stored = 0
+        self.evicted = 0
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """Return the cached entry for url, fresh or stale"""
+        row = self.conn.execute(
+            "SELECT body, encoding, etag, last_modified, expires_at FROM responses WHERE url = ?",
+            (url,),
+        ).fetchone()
+        if row is None:
+            return None
+        body, encoding, etag, last_modified, expires_at = row
+        return {
+            "url": url,
+            "body": body,
+            "encoding": encoding,
+            "etag": etag,
+            "last_modified": last_modified,
+            "expires_at": expires_at,
+        }
+
+    @staticmethod
+    def is_fresh(entry: CachedResponse) -> bool:
+        """Whether the entry can be served without asking the server"""
+        return entry["expires_at"] is None or entry["expires_at"] > time.time()
+
+    @staticmethod
+    def conditional_headers(entry: Optional[CachedResponse]) -> dict:
+        """Validators to send so the server can answer 304 Not Modified"""
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def hit(self, entry: CachedResponse) -> CachedResponse:
+        """Record a fresh hit and bump the entry's LRU position"""
+        self.hits += 1
+        self._touch(entry["url"])
+        return entry
+
+    def revalidate(self, entry: CachedResponse) -> CachedResponse:
+        """Extend a stale entry after the server answered 304"""
+        self.revalidated += 1
+        ttl = ttl_for(entry["url"])
+        entry["expires_at"] = None if ttl is None else time.time() + ttl
+        self.conn.execute(
+            "UPDATE responses SET expires_at = ?, last_access = ? WHERE url = ?",
+            (entry["expires_at"], time.time(), entry["url"]),
+        )
+        self.conn.commit()
+        return entry
+
+    def store(self, url: str, response: Response):
+        """Record a miss and cache the response if its URL's TTL allows"""
+        self.misses += 1
+        ttl = ttl_for(url)
+        if response.status_code != 200 or ttl == 0:
+            return
+        if "no-store" in response.headers.get("Cache-Control", ""):
+            return
+
+        body = response.content
+        if len(body) > self.max_bytes:
+            return
+        now = time.time()
+        old = self.conn.execute(
+            "SELECT size FROM responses WHERE url = ?", (url,)
+        ).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                url,
+                body,
+                response.encoding,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                None if ttl is None else now + ttl,
+                now,
+                len(body),
+            ),
+        )
+        self.size += len(body) - (old[0] if old else 0)
+        self.stored += 1
+        self._evict()
+        self.conn.commit()
+
+    def _touch(self, url: str):
+        self.conn.execute(
+            "UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url)
+        )
+        self.conn.commit()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits max_bytes"""
+        while self.size > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT url, size FROM responses ORDER BY last_access LIMIT 32"
+            ).fetchall()
+            if not rows:
+                self.size = 0
+                return
+            for url, size in rows:
+                if self.size <= self.max_bytes:
+                    break
+                self.conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                self.size -= size
+                self.evicted += 1
+
+    def clear(self):
+        """Remove every cached response"""
+        self.conn.execute("DELETE FROM responses")
+        self.conn.commit()
+        self.size = 0
+
+    def close(self):
+        self.conn.close()
+
+    def stats(self) -> CacheStats:
+        """Hit/miss counters and current size of the cache"""
+        entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "stored": self.stored,
+            "evicted": self.evicted,
+            "entries": entries,
+            "size": self.size,
+        }
+
+    def summary(self) -> str:
+        """One-line human readable summary of the cache stats"""
+        s = self.stats()
+        return (
+            f"Cache: {s['hits']} hits, {s['revalidated']} revalidated, "
+            f"{s['misses']} misses, {s['evicted']} evicted, "
+            f"{s['entries']} entries ({s['size'] / 1024 / 1024:.1f} MB)"
+        )
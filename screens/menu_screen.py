@@ -1,20 +1,24 @@
-import asyncio
-import threading
-
 from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.uix.screenmanager import Screen
 
-from data_getter import generate_random_properties
 from database import PropertyDatabase
+from replenisher import PropertyReplenisher
+from screens.property_game import PROPERTIES_PER_GAME
 
 
 class MenuScreen(Screen):
-    def __init__(self, **kwargs):
+    def __init__(self, db=None, replenisher=None, **kwargs):
         super().__init__(**kwargs)
-        self.db = PropertyDatabase()
+        self.db = db or PropertyDatabase()
+        self.replenisher = replenisher or PropertyReplenisher(self.db)
+        self.replenisher.progress_callback = self.update_progress
+        self.replenisher.on_replenished = self.on_replenished
+        # Set while the loading screen waits on the replenisher
+        self.waiting_to_start = False
+        self.generating = False
         layout = BoxLayout(orientation="vertical", padding=20, spacing=20)
 
         # Add spacer at top
@@ -48,34 +52,74 @@ class MenuScreen(Screen):
         self.check_database_status()
 
     def check_database_status(self):
-        """Check if there are enough properties in the database"""
-        count = self.db.count_properties()
-        if count < 10:  # Need at least 10 properties for a game
-            self.start_button.disabled = True
-            self.start_button.text = "Need more properties"
+        """Show how many unused properties are ready for a game"""
+        count = self.db.count_properties(unused_only=True)
+        if count < PROPERTIES_PER_GAME:
+            # Start waits on the loading screen while the pool fills
+            self.start_button.text = (
+                f"Start (fetching properties {count}/{PROPERTIES_PER_GAME})"
+            )
         else:
-            self.start_button.disabled = False
             self.start_button.text = "Start"
 
     def start_game(self, instance):
         # Double check database status before starting
-        count = self.db.count_properties()
-        if count < 10:
-            self.manager.current = "loading"
-            self.start_generation()
+        count = self.db.count_properties(unused_only=True)
+        if count < PROPERTIES_PER_GAME:
+            self.waiting_to_start = True
+            self.show_loading("Fetching properties...")
+            self.replenisher.start()
+            self.replenisher.wake()
             return
 
+        self.waiting_to_start = False
         self.manager.get_screen("game").load_properties()
         self.manager.current = "game"
 
     def generate_data(self, instance):
-        self.manager.current = "loading"
-        self.start_generation()
+        """Ask the replenisher for a batch now, even if the pool is full"""
+        self.generating = True
+        self.show_loading("Generating new properties...")
+        self.replenisher.start()
+        self.replenisher.wake(force=True)
 
-    def update_progress(self, progress):
-        """Update the loading screen progress"""
+    def show_loading(self, text):
         loading_screen = self.manager.get_screen("loading")
-        loading_screen.progress_bar.value = progress
+        loading_screen.status_label.text = text
+        loading_screen.progress_bar.value = 0
+        self.manager.current = "loading"
+
+    def on_replenished(self, saved, unused):
+        """Called from the replenisher thread after each batch"""
+        Clock.schedule_once(lambda dt: self.replenished(saved, unused))
+
+    def replenished(self, saved, unused):
+        self.check_database_status()
+        if not (self.waiting_to_start or self.generating):
+            return
+        if not saved:
+            self.waiting_to_start = self.generating = False
+            self.generation_error("No new properties could be fetched")
+        elif self.waiting_to_start:
+            # Keep waiting until a full game is available
+            if unused >= PROPERTIES_PER_GAME:
+                self.start_game(None)
+        else:
+            self.generating = False
+            self.generation_complete()
+
+    def update_progress(self, progress, stage=None, done=None, total=None):
+        """Update the loading screen progress from the generation thread"""
+
+        def apply(dt):
+            loading_screen = self.manager.get_screen("loading")
+            loading_screen.progress_bar.value = progress
+            if stage:
+                loading_screen.status_label.text = (
+                    f"Generating new properties... ({stage}: {done}/{total})"
+                )
+
+        Clock.schedule_once(apply)
 
     def generation_complete(self, *args):
         """Called when generation is complete"""
@@ -89,27 +133,3 @@ class MenuScreen(Screen):
         loading_screen = self.manager.get_screen("loading")
         loading_screen.status_label.text = f"Error: {str(error)}"
         Clock.schedule_once(lambda dt: setattr(self.manager, "current", "menu"), 3)
-
-    def start_generation(self):
-        """Start property generation in a non-blocking way"""
-        loading_screen = self.manager.get_screen("loading")
-        loading_screen.status_label.text = "Generating new properties..."
-        loading_screen.progress_bar.value = 0
-
-        async def generation_task():
-            try:
-                await generate_random_properties(10, self.db, self.update_progress)
-                Clock.schedule_once(self.generation_complete)
-            except Exception as e:
-                Clock.schedule_once(lambda dt: self.generation_error(str(e)))
-
-        # Run the async task in a separate thread
-        def run_async_task():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(generation_task())
-            loop.close()
-
-        thread = threading.Thread(target=run_async_task)
-        thread.daemon = True
-        thread.start()
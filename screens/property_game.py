@@ -1,8 +1,8 @@
-import io
+from concurrent.futures import ThreadPoolExecutor
 
 from kivy.clock import Clock
-from kivy.core.image import Image as CoreImage
 from kivy.core.window import Window
+from kivy.graphics import Color, Ellipse
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.image import Image
@@ -12,23 +12,50 @@ from kivy.uix.scrollview import ScrollView
 from kivy.uix.textinput import TextInput
 
 from database import PropertyDatabase
+from texture_cache import (
+    TEXTURE_CACHE_BYTES,
+    TextureCache,
+    create_texture,
+    decode_image,
+    load_texture,
+    rendition_edge,
+)
+from uk_map import get_base_map
+
+PROPERTIES_PER_GAME = 10
 
 
 class PropertyGame(Screen):
-    def __init__(self, **kwargs):
+    def __init__(
+        self, db=None, replenisher=None, texture_budget=TEXTURE_CACHE_BYTES, **kwargs
+    ):
         super().__init__(**kwargs)
 
-        self.db = PropertyDatabase()
+        self.db = db or PropertyDatabase()
+        self.replenisher = replenisher
         self.properties = []
         self.current_property = None
-        self.current_images = []
+        self.current_handle = None
+        self.gallery = []
         self.current_image_index = 0
+        self.base_map = None
+        self.base_map_texture = None
+        # Decoded gallery textures, filled ahead of navigation by one
+        # background thread that reads and decodes the neighbouring images
+        self.texture_cache = TextureCache(texture_budget)
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=1)
+        # The base map renders on its own thread so it never queues ahead
+        # of the first gallery images
+        self.base_map_executor = ThreadPoolExecutor(max_workers=1)
+        self.prefetching = set()
+        self.waiting_key = None
         self.score = 0
         self.guesses_remaining = 5
         self.revealed_info = []
 
         # Initialize UI components
         self.setup_ui()
+        self.load_base_map()
 
     def setup_ui(self):
         """Create and organize all UI elements"""
@@ -85,6 +112,12 @@ class PropertyGame(Screen):
         self.image_widget = Image(allow_stretch=True, keep_ratio=True)
         image_area.add_widget(self.image_widget)
 
+        # Location marker, drawn over the shared base map texture
+        with self.image_widget.canvas.after:
+            self.marker_color = Color(1, 0, 0, 0)
+            self.marker = Ellipse(size=(0, 0))
+        self.image_widget.bind(pos=self.update_marker, size=self.update_marker)
+
         # Navigation controls
         nav_buttons = BoxLayout(size_hint_y=0.2, spacing=10)
         self.prev_button = Button(
@@ -138,23 +171,62 @@ class PropertyGame(Screen):
         if direction == "left" and self.current_image_index > 0:
             self.current_image_index -= 1
             self.update_display()
-        elif (
-            direction == "right"
-            and self.current_image_index < len(self.current_images) - 1
-        ):
+        elif direction == "right" and self.current_image_index < len(self.gallery) - 1:
             self.current_image_index += 1
             self.update_display()
 
+    def load_base_map(self):
+        """Render the shared base map in the background, once per session
+
+        Rendering every polygon takes seconds, so it starts when the screen
+        is created and the texture is uploaded on the UI thread when ready.
+        """
+
+        def render():
+            base_map = get_base_map()
+            if base_map is None:
+                return None, None
+            height, width = base_map.pixels.shape[:2]
+            decoded = {
+                "size": (width, height),
+                "colorfmt": "rgba",
+                "pixels": base_map.pixels.tobytes(),
+            }
+            return base_map, decoded
+
+        future = self.base_map_executor.submit(render)
+        future.add_done_callback(
+            lambda future: Clock.schedule_once(
+                lambda dt: self.on_base_map_loaded(future)
+            )
+        )
+
+    def on_base_map_loaded(self, future):
+        try:
+            base_map, decoded = future.result()
+        except Exception as e:
+            print(f"Error rendering base map: {str(e)}")
+            return
+        if base_map is None:
+            return
+        self.base_map = base_map
+        self.base_map_texture = create_texture(decoded)
+        if self.current_property:
+            # A game started before the map was ready: add it to the gallery
+            # while keeping the entry on screen
+            entry = self.gallery[self.current_image_index] if self.gallery else None
+            self.gallery = self.build_gallery()
+            if entry in self.gallery:
+                self.current_image_index = self.gallery.index(entry)
+            self.update_display()
+
     def load_properties(self):
         """Load properties from database"""
-        property_data = self.db.get_random_unused_properties(10)
-        if not property_data:
-            # If no unused properties, reset all properties to unused
-            self.db.reset_used_status()
-            # Try to get properties again
-            property_data = self.db.get_random_unused_properties(10)
-
-        self.properties = property_data
+        # Played properties stay used; the replenisher tops the pool back up
+        self.properties = self.db.get_random_unused_properties(PROPERTIES_PER_GAME)
+        if self.replenisher:
+            self.replenisher.wake()
+
         self.remaining_label.text = f"Properties remaining: {len(self.properties)}"
         if self.properties:
             self.random_btn.disabled = False
@@ -203,12 +275,16 @@ class PropertyGame(Screen):
 
     def load_random_property(self, instance):
         if self.properties:
-            self.current_property, images, plot = self.properties.pop(0)
-            # Insert plot as first image if it exists
-            self.current_images = []
-            if plot:
-                self.current_images.append(plot)
-            self.current_images.extend(images)
+            # The previous property is never shown again
+            if self.current_handle:
+                previous_id = self.current_handle.id
+                self.texture_cache.discard(lambda key: key[0] == previous_id)
+
+            # Images are read from the database only when displayed, with
+            # the location map shown first
+            self.current_handle = self.properties.pop(0)
+            self.current_property = self.current_handle.data
+            self.gallery = self.build_gallery()
 
             self.current_image_index = 0
             self.price_input.text = ""
@@ -222,29 +298,152 @@ class PropertyGame(Screen):
             self.update_info_panel()
             self.update_display()
 
+    def build_gallery(self):
+        """Gallery entries for the current property: the map, then each image"""
+        gallery = []
+        latitude = self.current_property.get("latitude")
+        longitude = self.current_property.get("longitude")
+        if latitude and longitude and self.base_map_texture:
+            gallery.append("map")
+        elif self.current_handle.has_plot:
+            # Stored plot from older ingests, when no base map is available
+            gallery.append("plot")
+        gallery.extend(range(self.current_handle.image_count))
+        return gallery
+
+    def update_marker(self, *args):
+        """Place the location marker over the displayed base map"""
+        showing_map = (
+            self.current_property
+            and 0 <= self.current_image_index < len(self.gallery)
+            and self.gallery[self.current_image_index] == "map"
+        )
+        if not showing_map:
+            self.marker_color.a = 0
+            return
+
+        px, py = self.base_map.project(
+            self.current_property["latitude"], self.current_property["longitude"]
+        )
+        cx0, cy0, cx1, cy1 = self.base_map.clip
+        if not (cx0 <= px <= cx1 and cy0 <= py <= cy1):
+            self.marker_color.a = 0
+            return
+
+        # Map base map pixels (origin top-left) into the fitted texture area
+        width, height = self.image_widget.norm_image_size
+        left = self.image_widget.center_x - width / 2
+        bottom = self.image_widget.center_y - height / 2
+        scale = width / self.base_map.width
+        radius = self.base_map.marker_radius() * scale
+        x = left + px * scale
+        y = bottom + height - py * height / self.base_map.height
+        self.marker.pos = (x - radius, y - radius)
+        self.marker.size = (radius * 2, radius * 2)
+        self.marker_color.a = 1
+
+    def image_max_edge(self) -> int:
+        return int(max(self.image_widget.size))
+
+    def texture_key(self, handle, entry):
+        """Cache key for a gallery entry at the rendition the widget needs"""
+        edge = None if entry == "plot" else rendition_edge(self.image_max_edge())
+        return (handle.id, entry, edge)
+
+    @staticmethod
+    def read_entry(handle, entry, max_edge):
+        """Image bytes for a plot or image gallery entry"""
+        if entry == "plot":
+            return handle.plot()
+        # Load the smallest stored rendition that fills the widget
+        return handle.image(entry, max_edge)
+
+    def prefetch(self, handle, entry):
+        """Read and decode a gallery entry in the background, then cache it"""
+        if entry == "map":
+            return
+        key = self.texture_key(handle, entry)
+        if key in self.texture_cache or key in self.prefetching:
+            return
+        max_edge = self.image_max_edge()
+
+        def read_and_decode():
+            image_data = self.read_entry(handle, entry, max_edge)
+            return decode_image(image_data) if image_data else None
+
+        try:
+            future = self.prefetch_executor.submit(read_and_decode)
+        except RuntimeError:
+            # Executor shut down as the app stops
+            return
+        self.prefetching.add(key)
+        # Textures can only be created on the UI thread
+        future.add_done_callback(
+            lambda future: Clock.schedule_once(
+                lambda dt: self.on_prefetched(key, future)
+            )
+        )
+
+    def on_prefetched(self, key, future):
+        self.prefetching.discard(key)
+        try:
+            decoded = future.result()
+        except Exception as e:
+            print(f"Error prefetching image: {str(e)}")
+            decoded = None
+        if decoded:
+            self.texture_cache.put(key, create_texture(decoded))
+        if key == self.waiting_key:
+            # The user navigated here while it was decoding
+            self.update_display()
+
+    def prefetch_neighbours(self):
+        """Queue the next and previous images and the next property's first"""
+        for index in (self.current_image_index + 1, self.current_image_index - 1):
+            if 0 <= index < len(self.gallery):
+                self.prefetch(self.current_handle, self.gallery[index])
+        if self.properties and self.properties[0].image_count:
+            self.prefetch(self.properties[0], 0)
+
+    def stop_prefetch(self):
+        """Cancel queued decodes; called when the app stops"""
+        self.prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        self.base_map_executor.shutdown(wait=False, cancel_futures=True)
+
     def update_display(self):
         if not self.current_property:
             return
 
         # Update property image
-        if self.current_images and 0 <= self.current_image_index < len(
-            self.current_images
-        ):
-            image_data = self.current_images[self.current_image_index]
-            image = CoreImage(
-                io.BytesIO(image_data),
-                ext="png" if self.current_image_index == 0 else "jpg",
-            )
-            self.image_widget.texture = image.texture
+        self.waiting_key = None
+        gallery_size = len(self.gallery)
+        if 0 <= self.current_image_index < gallery_size:
+            entry = self.gallery[self.current_image_index]
+            if entry == "map":
+                self.image_widget.texture = self.base_map_texture
+            else:
+                key = self.texture_key(self.current_handle, entry)
+                texture = self.texture_cache.get(key)
+                if texture is None and key in self.prefetching:
+                    # Already decoding: on_prefetched shows it when ready
+                    self.waiting_key = key
+                elif texture is None:
+                    image_data = self.read_entry(
+                        self.current_handle, entry, self.image_max_edge()
+                    )
+                    texture = load_texture(image_data)
+                    self.texture_cache.put(key, texture)
+                if texture is not None:
+                    self.image_widget.texture = texture
+            self.update_marker()
             self.image_counter.text = (
-                f"Image {self.current_image_index + 1}/{len(self.current_images)}"
+                f"Image {self.current_image_index + 1}/{gallery_size}"
             )
 
             # Update navigation button states
             self.prev_button.disabled = self.current_image_index == 0
-            self.next_button.disabled = (
-                self.current_image_index >= len(self.current_images) - 1
-            )
+            self.next_button.disabled = self.current_image_index >= gallery_size - 1
+            self.prefetch_neighbours()
 
     def check_guess(self, instance):
         if not self.current_property or self.guesses_remaining <= 0:
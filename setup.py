@@ -6,9 +6,10 @@ setup(
     packages=["propertypriceapp"],
     install_requires=[
         "kivy",
-        "httpx",
+        "httpx[http2]",
         "jmespath",
         "parsel",
         "matplotlib",
+        "Pillow",
     ],
 )
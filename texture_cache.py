@@ -0,0 +1,119 @@
+import io
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, TypedDict
+
+from kivy.graphics.texture import Texture
+from PIL import Image
+
+from database import RENDITION_SIZES
+
+# Upper bound on decoded texture memory kept for the game screen
+TEXTURE_CACHE_BYTES = 96 * 1024 * 1024
+
+
+class DecodedImage(TypedDict):
+    size: tuple
+    colorfmt: str
+    pixels: bytes
+
+
+def rendition_edge(max_edge: int) -> Optional[int]:
+    """The stored rendition size read_image picks for max_edge, None for originals"""
+    sizes = sorted(size for size in RENDITION_SIZES.values() if size >= max_edge)
+    return sizes[0] if sizes else None
+
+
+def decode_image(image_data: bytes) -> DecodedImage:
+    """Decode JPEG/PNG bytes to raw pixels; safe to call off the UI thread"""
+    with Image.open(io.BytesIO(image_data)) as image:
+        colorfmt = "rgba" if "A" in image.getbands() else "rgb"
+        image = image.convert(colorfmt.upper())
+        return {
+            "size": image.size,
+            "colorfmt": colorfmt,
+            "pixels": image.tobytes(),
+        }
+
+
+def create_texture(decoded: DecodedImage) -> Texture:
+    """Upload decoded pixels to a texture; must run on the UI thread"""
+    texture = Texture.create(size=decoded["size"], colorfmt=decoded["colorfmt"])
+    texture.blit_buffer(
+        decoded["pixels"], colorfmt=decoded["colorfmt"], bufferfmt="ubyte"
+    )
+    # PIL rows run top to bottom, OpenGL rows bottom to top
+    texture.flip_vertical()
+    return texture
+
+
+def load_texture(image_data: bytes) -> Texture:
+    """Decode and upload image bytes on the UI thread"""
+    return create_texture(decode_image(image_data))
+
+
+def texture_bytes(texture: Texture) -> int:
+    """Approximate GPU memory of a texture, which is stored as RGBA"""
+    width, height = texture.size
+    return width * height * 4
+
+
+class TextureCache:
+    """Least recently used textures, bounded by their total size in bytes"""
+
+    def __init__(self, max_bytes: int = TEXTURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key: Hashable) -> Optional[Texture]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, texture: Texture):
+        nbytes = texture_bytes(texture)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.size -= old[1]
+            if nbytes > self.max_bytes:
+                return
+            self.entries[key] = (texture, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.size -= evicted_bytes
+                self.evicted += 1
+
+    def discard(self, predicate: Callable[[Hashable], bool]):
+        """Drop every entry whose key matches predicate"""
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                self.size -= self.entries.pop(key)[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def summary(self) -> str:
+        return (
+            f"Textures: {self.hits} hits, {self.misses} misses, "
+            f"{self.evicted} evicted, {len(self.entries)} cached "
+            f"({self.size / 1024 / 1024:.1f} of {self.max_bytes / 1024 / 1024:.0f} MB)"
+        )
@@ -0,0 +1,163 @@
+import io
+import json
+import os
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PatchCollection
+from matplotlib.figure import Figure
+from matplotlib.patches import Polygon
+from PIL import Image
+
+from polygon_format import PolygonFile
+
+UK_POLYGONS_FILE = "uk_polygons.json"
+UK_POLYGONS_BINARY = "uk_polygons.bin"
+# Level of detail simplified to under half a pixel at the base map's DPI
+BASE_MAP_LEVEL = "base_map"
+
+# Figure settings shared with the original per-property plot
+FIGSIZE = (10, 12)
+DPI = 100
+TITLE = "Position on UK Map"
+
+# Matches matplotlib's "ro" marker: markersize 10pt with a 1pt red edge
+MARKER_SIZE = 10
+MARKER_EDGE_WIDTH = 1.0
+MARKER_COLOR = (255, 0, 0)
+
+
+class BaseMap:
+    """The UK map rendered once, with a lat/lon to pixel projection"""
+
+    def __init__(self, polygons_file: Optional[str] = None, dpi: int = DPI):
+        uk_data = load_polygons(polygons_file)
+
+        fig = Figure(figsize=FIGSIZE, dpi=dpi)
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+
+        # Create polygon patches
+        patches = [
+            Polygon(polygon_coords, closed=True)
+            for polygon_coords in uk_data["polygons"]
+        ]
+        collection = PatchCollection(
+            patches, facecolor="lightgray", edgecolor="black", linewidth=0.5
+        )
+        ax.add_collection(collection)
+
+        # Set the plot bounds
+        ax.set_xlim(uk_data["bounds"]["x"])
+        ax.set_ylim(uk_data["bounds"]["y"])
+
+        ax.set_title(TITLE)
+        ax.axis("off")
+        fig.tight_layout()
+        canvas.draw()
+
+        self.dpi = dpi
+        self.pixels = np.asarray(canvas.buffer_rgba()).copy()
+        self.height, self.width = self.pixels.shape[:2]
+
+        # Pixel positions (origin top-left) of the axes corners, which map
+        # linearly to the longitude/latitude bounds
+        (x0, y0), (x1, y1) = ax.transData.transform(
+            [
+                (uk_data["bounds"]["x"][0], uk_data["bounds"]["y"][0]),
+                (uk_data["bounds"]["x"][1], uk_data["bounds"]["y"][1]),
+            ]
+        )
+        self.bounds = uk_data["bounds"]
+        self.pixel_bounds = (x0, self.height - y0, x1, self.height - y1)
+        bbox = ax.bbox
+        self.clip = (
+            int(round(bbox.x0)),
+            int(round(self.height - bbox.y1)),
+            int(round(bbox.x1)),
+            int(round(self.height - bbox.y0)),
+        )
+
+    def project(self, latitude: float, longitude: float) -> Tuple[float, float]:
+        """Convert latitude/longitude to (x, y) pixels from the top-left"""
+        (lon0, lon1), (lat0, lat1) = self.bounds["x"], self.bounds["y"]
+        px0, py0, px1, py1 = self.pixel_bounds
+        x = px0 + (longitude - lon0) / (lon1 - lon0) * (px1 - px0)
+        y = py0 + (latitude - lat0) / (lat1 - lat0) * (py1 - py0)
+        return x, y
+
+    def marker_radius(self) -> float:
+        """Marker radius in pixels, including its edge"""
+        return (MARKER_SIZE + MARKER_EDGE_WIDTH) / 2 * self.dpi / 72
+
+    def render_marker(self, latitude: float, longitude: float) -> bytes:
+        """PNG of the base map with an anti-aliased marker at the location"""
+        pixels = self.pixels.copy()
+        x, y = self.project(latitude, longitude)
+        # Agg snaps marker centres to the middle of the nearest pixel
+        x, y = np.floor(x + 0.5) + 0.5, np.floor(y + 0.5) + 0.5
+        radius = self.marker_radius()
+
+        # Only touch the marker's neighbourhood, clipped to the axes like
+        # matplotlib clips markers
+        cx0, cy0, cx1, cy1 = self.clip
+        left = max(int(x - radius) - 1, cx0)
+        right = min(int(x + radius) + 2, cx1)
+        top = max(int(y - radius) - 1, cy0)
+        bottom = min(int(y + radius) + 2, cy1)
+        if left < right and top < bottom:
+            ys, xs = np.mgrid[top:bottom, left:right]
+            distance = np.hypot(xs + 0.5 - x, ys + 0.5 - y)
+            coverage = np.clip(radius + 0.5 - distance, 0.0, 1.0)[..., None]
+            region = pixels[top:bottom, left:right, :3].astype(np.float32)
+            blended = region * (1 - coverage) + np.array(MARKER_COLOR) * coverage
+            pixels[top:bottom, left:right, :3] = blended.round().astype(np.uint8)
+        return encode_png(pixels)
+
+
+def load_polygons(polygons_file: Optional[str] = None) -> dict:
+    """Load {"polygons", "bounds"}, preferring the memory-mapped binary file"""
+    if polygons_file is None:
+        polygons_file = (
+            UK_POLYGONS_BINARY
+            if os.path.exists(UK_POLYGONS_BINARY)
+            else UK_POLYGONS_FILE
+        )
+    if polygons_file.endswith(".bin"):
+        polygon_file = PolygonFile(polygons_file)
+        level = (
+            BASE_MAP_LEVEL
+            if BASE_MAP_LEVEL in polygon_file.levels
+            else polygon_file.level_names()[0]
+        )
+        return {"polygons": polygon_file.rings(level), "bounds": polygon_file.bounds}
+    with open(polygons_file, "r") as f:
+        return json.load(f)
+
+
+def encode_png(pixels: np.ndarray) -> bytes:
+    buf = io.BytesIO()
+    # Fast compression: the map is mostly flat colour, so size barely changes
+    Image.fromarray(pixels, "RGBA").save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+
+_base_map: Optional[BaseMap] = None
+_base_map_lock = threading.Lock()
+
+
+def get_base_map() -> Optional[BaseMap]:
+    """Return the process-wide base map, rendering it on first use"""
+    global _base_map
+    with _base_map_lock:
+        if _base_map is None:
+            try:
+                _base_map = BaseMap()
+            except FileNotFoundError:
+                print(
+                    "UK polygons file not found. Please run generate_uk_polygons.py first."
+                )
+                return None
+        return _base_map